@@ -62,6 +62,26 @@ class Context:
 
     stark_file = util.Configurable('starkfile', 'starks')
 
+    thread_pool_size = util.Configurable(
+        'thread_pool.size',
+        imbroglio.thread_pool.size,
+        'number of threads to run blocking calls (DNS, kerberos...) in',
+        coerce=int,
+        validate=lambda x: x > 0,
+        action=lambda context, value: imbroglio.thread_pool.resize(value),
+        )
+
+    offload_threshold = util.Configurable(
+        'network.offload_threshold',
+        0,
+        'decompress (in a thread) and parse (incrementally) network payloads'
+        ' of at least this many bytes off to the side; 0 to never',
+        coerce=int,
+        validate=lambda x: x >= 0,
+        action=lambda context, value: setattr(
+            util, 'OFFLOAD_THRESHOLD', value),
+        )
+
     def __init__(self, home=None):
         self.conf = {
             'filter': {
@@ -155,6 +175,9 @@ class Context:
         return loaded
 
     def conf_write(self):
+        # whatever was changed, things worked out from the old settings
+        # (like named filters) are stale now
+        util.Configurable.generation += 1
         self.ensure_directory()
         with util.safe_write(os.path.join(self.directory, 'config')) as fp:
             json.dump(self.conf, fp)
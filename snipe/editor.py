@@ -943,9 +943,12 @@ class PopViewer(Viewer):
             pct = '%d%%' % (sill / len(self.buf) * 100)
         except ZeroDivisionError:
             pct = '-'
-        count = self.context.backends.count()
+        count = '%d' % (self.context.backends.count(),)
+        total = self.context.backends.count_total()
+        if count != str(total):
+            count += '/%d' % (total,)
         return (chunks.Chunk([((), '%s %s' % (pct, self.title()))]),
-                chunks.Chunk([(('right',), '%d' % (count,))]))
+                chunks.Chunk([(('right',), count)]))
 
     def destroy(self):
         self.buf.unregister()
@@ -37,7 +37,6 @@ import logging
 import operator
 import re
 import functools
-import weakref
 
 from typing import (Optional)
 
@@ -151,24 +150,123 @@ class SnipeFilterError(util.SnipeException):
     pass
 
 
+def field_getter(cls, name, canon=True):
+    """Return a function fetching ``m.field(name, canon)`` for messages of
+    class ``cls``, specialized by the class if it knows how."""
+
+    specialize = getattr(cls, 'field_getter', None)
+    if specialize is not None:
+        return specialize(name, canon)
+    return lambda m: m.field(name, canon)
+
+
+class Compiler:
+    """Turn a filter into a single Python function of a message.
+
+    Filters contribute an expression in ``m`` through their ``_source``
+    method, stashing anything they need (compiled regexps, constants) in
+    the function's namespace with ``constant`` and asking for message fields
+    with ``field``.  Field values are read straight out of the message's
+    field tables when the class keeps them the usual way and they're
+    current; otherwise (or if the field hasn't been worked out yet) through
+    getters looked up, and built the first time, by the class of the
+    message.
+    """
+
+    def __init__(self):
+        self.namespace = {}
+        self.fields = {}
+
+    def constant(self, value):
+        name = '_k%d' % (len(self.namespace),)
+        self.namespace[name] = value
+        return name
+
+    def field(self, name, canon=True):
+        key = (name, canon)
+        slot = self.fields.get(key)
+        if slot is None:
+            slot = self.fields[key] = len(self.fields)
+        table = '_t2' if canon else '_t1'
+        return '(%s[%r] if %r in %s else _getters[%d](m))' % (
+            table, name, name, table, slot)
+
+    def compile(self, filt):
+        expr = filt._source(self)
+        if self.fields:
+            prologue = (
+                '    try:\n'
+                '        _tables, _getters = _byclass[m.__class__]\n'
+                '    except KeyError:\n'
+                '        _tables, _getters = _specialize(m.__class__)\n'
+                '    _fs = m.fields if _tables else None\n'
+                '    if _fs is not None and _fs[0] == getattr(\n'
+                '            m.backend, "display_generation", None):\n'
+                '        _t1, _t2 = _fs[1], _fs[2]\n'
+                '    else:\n'
+                '        _t1 = _t2 = _empty\n')
+        else:
+            prologue = ''
+        source = 'def _filter(m):\n' + prologue + '    return ' + expr + '\n'
+
+        keys = sorted(self.fields, key=self.fields.get)
+        byclass = {}
+
+        def specialize(cls):
+            tables = getattr(cls, 'field_tables', None)
+            entry = byclass[cls] = (
+                tables is not None and tables(),
+                tuple(field_getter(cls, *key) for key in keys))
+            return entry
+
+        namespace = dict(self.namespace)
+        namespace['_byclass'] = byclass
+        namespace['_specialize'] = specialize
+        namespace['_empty'] = {}
+        exec(compile(source, '<filter>', 'exec'), namespace)
+        compiled = namespace['_filter']
+        compiled.source = source
+        return compiled
+
+
 class Filter(object):
     name: Optional[str] = None
 
     def __init__(self):
-        self._cache = weakref.WeakKeyDictionary()
+        self._compiled = None
+        # what f(m) calls: this compiles the filter the first time, and is
+        # then replaced with the compiled function
+        self._call = self._compile_and_call
         self.log = logging.getLogger(
             'filter.%s.%x' % (self.__class__.__name__, id(self),))
 
-    def __call__(self, m):
-        r = self._cache.get(m)
-        if r is None:
-            r = self._check(m)
-            self._cache[m] = r
-        return r
+    # calling the filter calls _call without a Python-level __call__ in
+    # between
+    __call__ = property(operator.attrgetter('_call'))
+
+    def _compile_and_call(self, m):
+        return self.compile()(m)
+
+    def compile(self):
+        """Return (and remember) a function equivalent to ``_check``."""
+        if self._compiled is None:
+            self._compiled = self._call = self._compile()
+        return self._compiled
+
+    def _compile(self):
+        return Compiler().compile(self)
+
+    def _source(self, compiler):
+        return compiler.constant(self._check) + '(m)'
 
     def _check(self, m, state=None):
         raise NotImplementedError
 
+    def expand(self, section, seen=frozenset()):
+        """Return this filter with named filter references replaced by
+        what they refer to in ``section``."""
+        return self
+
     def simplify(self, d):
         return self
 
@@ -200,6 +298,9 @@ class Yes(Certitude):
     def _check(self, m, state=None):
         return True
 
+    def _source(self, compiler):
+        return 'True'
+
     def simplify(self, d):
         return True
 
@@ -208,6 +309,9 @@ class No(Certitude):
     def _check(self, m, state=None):
         return False
 
+    def _source(self, compiler):
+        return 'False'
+
     def simplify(self, d):
         return False
 
@@ -222,6 +326,13 @@ class Not(Filter):
     def _check(self, m, state=None):
         return not self.p._check(m, state)
 
+    def _source(self, compiler):
+        return '(not ' + self.p._source(compiler) + ')'
+
+    def expand(self, section, seen=frozenset()):
+        p = self.p.expand(section, seen)
+        return self if p is self.p else Not(p)
+
     def __str__(self):
         return self.gname() + ' ' + self.parenthesize(self.p)
 
@@ -249,6 +360,9 @@ class Truth(Filter):
     def _check(self, m, state=None):
         return bool(m.field(self.field))
 
+    def _source(self, compiler):
+        return 'bool(' + compiler.field(self.field) + ')'
+
     def __str__(self):
         return self.field
 
@@ -294,6 +408,12 @@ class Conjunction(Filter):
     def __hash__(self):
         return hash((self.__class__, self.operands))
 
+    def expand(self, section, seen=frozenset()):
+        operands = tuple(p.expand(section, seen) for p in self.operands)
+        if all(x is y for (x, y) in zip(operands, self.operands)):
+            return self
+        return self.__class__(*operands)
+
 
 class And(Conjunction):
     name = 'and'
@@ -304,6 +424,10 @@ class And(Conjunction):
                 return False
         return True
 
+    def _source(self, compiler):
+        return 'bool(' + ' and '.join(
+            p._source(compiler) for p in self.operands) + ')'
+
     def simplify(self, d):
         operands = []
         for p in self.operands:
@@ -331,6 +455,10 @@ class Or(Conjunction):
                 return True
         return False
 
+    def _source(self, compiler):
+        return 'bool(' + ' or '.join(
+            p._source(compiler) for p in self.operands) + ')'
+
     def simplify(self, d):
         operands = []
         for p in self.operands:
@@ -355,11 +483,20 @@ class Xor(Conjunction):
     def _check(self, m, state=None):
         return len([True for p in self.operands if p._check(m, state)]) == 1
 
+    def _source(self, compiler):
+        return '(' + ' + '.join(
+            'bool(' + p._source(compiler) + ')' for p in self.operands
+            ) + ' == 1)'
+
 
 class Python(Filter):
     def __init__(self, string):
         super().__init__()
         self.string = string
+        try:
+            self.code = compile(string, '<filter>', 'eval')
+        except SyntaxError:
+            self.code = string  # so that _check logs the error
 
     def __str__(self):
         return '$' + repr(self.string)
@@ -372,7 +509,7 @@ class Python(Filter):
 
     def _check(self, m, state=None):
         try:
-            return bool(eval(self.string, {}, {'m': m, 'state': state}))
+            return bool(eval(self.code, {}, {'m': m, 'state': state}))
         except BaseException:
             self.log.exception(
                 'executing python filter %s on %s',
@@ -392,6 +529,7 @@ class FilterLookup(Filter):
     def __init__(self, name):
         super().__init__()
         self.filtername = name
+        self._resolved = None
 
     def __repr__(self):
         return '%s(%s)' % (
@@ -399,28 +537,58 @@ class FilterLookup(Filter):
             repr(self.filtername),
             )
 
-    def _check(self, m, state=None):
-        if state is not None:
-            if self.filtername in state.setdefault('filterlookup', set()):
-                return False
-        else:
-            state = {'filterlookup': set()}
-
-        state['filterlookup'].add(self.filtername)
-
-        conf = m.backend.context.conf
-        self.log.debug('looking up filter %s', self.filtername)
-        text = conf.get('filter', {}).get(self.filtername)
+    def resolve(self, conf):
+        """Return the compiled named filter, with any filters it names in
+        turn expanded in place.  This is remembered until the configuration
+        changes (which bumps ``util.Configurable.generation``) or a
+        different one is consulted."""
+
+        resolved = self._resolved
+        if (resolved is not None
+                and resolved[1] == util.Configurable.generation
+                and resolved[0] is conf):
+            return resolved[2]
+
+        self.log.debug('resolving filter %s', self.filtername)
+        f = self.expand(conf.get('filter', {})).compile()
+        self._resolved = (conf, util.Configurable.generation, f)
+        return f
+
+    def _compile(self):
+        # the resolved filter is compiled already; wrapping it in another
+        # function would only add a call
+        return self.match
+
+    def match(self, m):
+        resolved = self._resolved
+        if (resolved is not None
+                and resolved[1] == util.Configurable.generation
+                and resolved[0] is m.backend.context.conf):
+            return resolved[2](m)
+        return self.resolve(m.backend.context.conf)(m)
+
+    def expand(self, section, seen=frozenset()):
+        text = section.get(self.filtername)
+        if self.filtername in seen:
+            self.log.debug('%s: recursive', self.filtername)
+            return No()
         if not text:
             self.log.debug('empty (%s)', repr(text))
-            return False
+            return No()
 
         try:
             self.log.debug('%s: %s', self.filtername, text)
-            return makefilter(text)._check(m, state)
+            filt = makefilter(text)
         except Exception:
             self.log.exception('in filter %s', self.filtername)
-            return False
+            return No()
+        return filt.expand(section, seen | {self.filtername})
+
+    def _check(self, m, state=None):
+        return self.match(m)
+
+    def _source(self, compiler):
+        return compiler.constant(self.match) + '(m)'
 
     def simplify(self, d):
         if self.filtername in d.setdefault('filterlookup', set()):
@@ -475,6 +643,11 @@ class Comparison(Filter):
             v = m.field(str(v), self.canon)
         return self.do(self.op, m.field(self.field, self.canon), v)
 
+    def _value_source(self, compiler):
+        if isinstance(self.value, Identifier):
+            return compiler.field(str(self.value), self.canon)
+        return compiler.constant(self.value)
+
     def __eq__(self, other):
         return (
             self.__class__ is other.__class__
@@ -509,17 +682,19 @@ class Comparison(Filter):
 
 
 class Compare(Comparison):
+    OPERATORS = {
+        '=': operator.eq,
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        }
+
     @staticmethod
     def do(op, left, right):
-        f = {
-            '=': operator.eq,
-            '==': operator.eq,
-            '!=': operator.ne,
-            '<': operator.lt,
-            '<=': operator.le,
-            '>': operator.gt,
-            '>=': operator.ge,
-            }[op]
+        f = Compare.OPERATORS[op]
         try:
             return f(left, right)
         except Exception:
@@ -527,6 +702,20 @@ class Compare(Comparison):
             logging.getLogger('filter').exception('in filter')
             return False
 
+    def _source(self, compiler):
+        left = compiler.field(self.field, self.canon)
+        right = self._value_source(compiler)
+        if self.op in ('=', '=='):
+            return '(' + left + ' == ' + right + ')'
+        elif self.op == '!=':
+            return '(' + left + ' != ' + right + ')'
+        # ordering comparisons between fields can raise
+        return '%s(%s, %s, %s)' % (
+            compiler.constant(self.do),
+            compiler.constant(self.op),
+            left,
+            right)
+
     @staticmethod
     def static(op, left, right):
         result = Compare.do(op, left, right)
@@ -536,9 +725,9 @@ class Compare(Comparison):
 class RECompare(Comparison):
     def __init__(self, *args, flags=''):
         super().__init__(*args)
+        self.flags = flags
         try:
             self.re = re.compile(self.value, self.deflag(flags))
-            self.flags = flags
         except Exception:
             self.log.exception('compiling regexp: %s', self.value)
             self.re = None
@@ -585,6 +774,14 @@ class RECompare(Comparison):
     def _check(self, m, state=None):
         return self.do(self.op, self.re, str(m.field(self.field, self.canon)))
 
+    def _source(self, compiler):
+        if self.re is None:
+            return 'False'
+        return '(%s(str(%s)) %s None)' % (
+            compiler.constant(self.re.search),
+            compiler.field(self.field, self.canon),
+            'is' if self.op[0] == '!' else 'is not')
+
     def __str__(self):
         return '%s %s /%s/%s' % (
             self.field,
@@ -891,3 +1088,12 @@ def validatefilter(s):
         return True
     except SnipeFilterError:
         return False
+
+
+def compiled(f):
+    """Return the compiled function for ``f`` if it's a Filter (calling
+    that directly skips dispatching through the filter object, which adds
+    up over a lot of messages), or ``f`` itself if it's some other
+    callable."""
+
+    return f.compile() if isinstance(f, Filter) else f
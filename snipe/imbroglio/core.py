@@ -42,9 +42,9 @@ __all__ = [
     ]
 
 
-import bisect
 import collections
 import functools
+import heapq
 import itertools
 import inspect
 import logging
@@ -189,9 +189,15 @@ Waiting = collections.namedtuple(
 class Supervisor:
     def __init__(self):
         self.runq = []
-        self.waitq = []
+        self.waiting = {}  # task -> Waiting
+        self.timers = []  # heap of (target, sequence, Waiting)
+        self.timer_sequence = itertools.count().__next__
+        self.stale_timers = 0
+        self.task_waiters = {}  # task -> {Waiting, ...}
         self.log = logging.getLogger('imbroglio')
         self.running = False
+        self.selector = None
+        self.fd_waiters = {}  # fd -> {Waiting, ...}
 
     def start(self, coro):
         """start a task from non-async code"""
@@ -264,13 +270,77 @@ class Supervisor:
         """internals of _call_readwait and _call_writewait"""
         now = time.monotonic()
         if duration is None:
-            bisect.insort_left(
-                self.waitq,
-                Waiting(float('Inf'), now, events, fd, task, other))
+            waiting = Waiting(float('Inf'), now, events, fd, task, other)
         else:
-            bisect.insort_left(
-                self.waitq,
-                Waiting(now + duration, now, events, fd, task, other))
+            waiting = Waiting(now + duration, now, events, fd, task, other)
+            heapq.heappush(
+                self.timers, (waiting.target, self.timer_sequence(), waiting))
+        self.waiting[task] = waiting
+        if events:
+            self._fd_add(waiting)
+        if other is not None:
+            self.task_waiters.setdefault(other, set()).add(waiting)
+
+    def _fd_add(self, waiting):
+        """register interest in waiting.fd with the selector"""
+        waiters = self.fd_waiters.setdefault(waiting.fd, set())
+        mask = functools.reduce(
+            lambda a, b: a | b.events, waiters, waiting.events)
+        waiters.add(waiting)
+        if len(waiters) == 1:
+            self.selector.register(waiting.fd, mask)
+        elif mask != self.selector.get_key(waiting.fd).events:
+            self.selector.modify(waiting.fd, mask)
+
+    def _fd_remove(self, waiting):
+        """drop interest in waiting.fd, if waiting was waiting on an fd"""
+        if not waiting.events:
+            return
+        waiters = self.fd_waiters[waiting.fd]
+        waiters.discard(waiting)
+        if not waiters:
+            del self.fd_waiters[waiting.fd]
+            self.selector.unregister(waiting.fd)
+            return
+        mask = functools.reduce(lambda a, b: a | b.events, waiters, 0)
+        if mask != self.selector.get_key(waiting.fd).events:
+            self.selector.modify(waiting.fd, mask)
+
+    def _unwait(self, waiting, timedout=False, now=None):
+        """remove a wait from the indexes and make its task runnable"""
+        del self.waiting[waiting.task]
+        self._fd_remove(waiting)
+        if waiting.other is not None:
+            waiters = self.task_waiters[waiting.other]
+            waiters.discard(waiting)
+            if not waiters:
+                del self.task_waiters[waiting.other]
+        if not timedout and not math.isinf(waiting.target):
+            # its timer is still in the heap; throw out the dead wood
+            # once there's more of it than anything else
+            self.stale_timers += 1
+            if self.stale_timers > max(len(self.timers) // 2, 64):
+                self.timers = [
+                    t for t in self.timers if self._live(t[2])]
+                heapq.heapify(self.timers)
+                self.stale_timers = 0
+        if now is None:
+            now = time.monotonic()
+        self.runq.append(
+            Runnable(waiting.task, (timedout, now - waiting.start)))
+
+    def _live(self, waiting):
+        return self.waiting.get(waiting.task) is waiting
+
+    def _next_timer(self):
+        """return the earliest live timer, discarding dead ones"""
+        while self.timers:
+            waiting = self.timers[0][2]
+            if self._live(waiting):
+                return waiting
+            heapq.heappop(self.timers)
+            self.stale_timers -= 1
+        return None
 
     def _call_this_task(self, task):
         """return the current task"""
@@ -284,7 +354,7 @@ class Supervisor:
         """return a tuple of lists of the runnable and waiting tasks"""
         self._return(task, (
             [t.task for t in self.runq],
-            [t.task for t in self.waitq],
+            list(self.waiting),
             ))
 
     def _call_switch(self, task):
@@ -296,12 +366,9 @@ class Supervisor:
         self.runq.append(Runnable(task, val))
 
     def _rouse(self, task):
-        for i, qe in enumerate(self.waitq):
-            if qe.task == task:
-                del self.waitq[i]
-                self.runq.append(
-                    Runnable(task, (False, time.monotonic() - qe[1])))
-                break
+        waiting = self.waiting.get(task)
+        if waiting is not None:
+            self._unwait(waiting)
 
     def _run(self, runtask):
         self.log.debug('starting scheduler loop')
@@ -358,74 +425,55 @@ class Supervisor:
 
         try:
             self.running = True
+            self.selector = selectors.DefaultSelector()
 
             while True:
                 tick = time.monotonic()
                 runq, self.runq = self.runq, []
 
                 # get the expired waits
-                division = bisect.bisect_right(
-                    self.waitq, (tick, tick, None))
-                wake, self.waitq = self.waitq[:division], self.waitq[division:]
-
-                for wakey in wake:
-                    duration = time.monotonic() - wakey.start
-                    self.runq.append(Runnable(wakey.task, (True, duration)))
+                while True:
+                    waiting = self._next_timer()
+                    if waiting is None or waiting.target > tick:
+                        break
+                    heapq.heappop(self.timers)
+                    self._unwait(waiting, True)
 
                 for run in runq:
                     _step(run.task, run.retval)
                     if run.task.is_done():
-                        for i, w in reversed(list(enumerate(self.waitq))):
-                            if w.other is run.task:
-                                duration = time.monotonic() - w.start
-                                self.runq.append(
-                                    Runnable(w.task, (False, duration)))
-                                del self.waitq[i]
-
-                if self.waitq:
-                    target = self.waitq[0].target
-                    if not math.isinf(target):
-                        duration = max(0.0, target - time.monotonic())
+                        for w in list(self.task_waiters.get(run.task, ())):
+                            self._unwait(w)
+
+                if self.waiting:
+                    waiting = self._next_timer()
+                    if waiting is not None:
+                        duration = max(0.0, waiting.target - time.monotonic())
                     else:
                         duration = None
                     if self.runq:  # we have runnable tasks, don't wait
                         duration = 0
-                    with selectors.DefaultSelector() as selector:
-                        fd_tasks = {}
-                        for e in self.waitq:
-                            if e.events:
-                                fd_tasks.setdefault(
-                                    e.fd, {}).setdefault(
-                                        e.events, []).append(e)
-                        for k, v in fd_tasks.items():
-                            eventmask = functools.reduce(
-                                lambda a, b: a | b, v.keys())
-                            selector.register(k, eventmask, v)
-                        cleanup = set()
-                        now = time.monotonic()
-                        for key, events in selector.select(duration):
-                            for mask, waiters in key.data.items():
-                                if events & mask:
-                                    for e in waiters:
-                                        cleanup.add(e)
-                                        self.runq.append(
-                                            Runnable(
-                                                e.task,
-                                                (False, now - e.start)))
-                        self.waitq = [
-                            e for e in self.waitq if e not in cleanup]
-
-                if not self.runq and not self.waitq:
+                    ready = self.selector.select(duration)
+                    now = time.monotonic()
+                    for key, events in ready:
+                        for e in list(self.fd_waiters.get(key.fileobj, ())):
+                            if events & e.events:
+                                self._unwait(e, False, now)
+
+                if not self.runq and not self.waiting:
                     break
         finally:
             self.running = False
+            self.selector.close()
+            self.selector = None
+            self.fd_waiters = {}
             if self.runq:  # pragma: nocover
                 print('Runnable tasks at supervisor exit:')
                 for t in self.runq:
                     print(f' {t!r}')
-            if self.waitq:  # pragma: nocover
+            if self.waiting:  # pragma: nocover
                 print('Waiting tasks at supervisor exit:')
-                for t in self.waitq:
+                for t in self.waiting.values():
                     print(f' {t!r}')
 
         return
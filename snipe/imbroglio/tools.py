@@ -35,19 +35,23 @@ Some useful things built on top of the imbroglio primitives
 __all__ = [
     'Event',
     'Promise',
+    'ThreadPool',
     'Timeout',
     'TimeoutError',
     'gather',
     'process_filter',
     'run_in_thread',
     'test',
+    'thread_pool',
     ]
 
 
+import collections
 import fcntl
 import functools
 import inspect
 import os
+import queue
 import socket
 import subprocess
 import threading
@@ -148,48 +152,140 @@ class Promise:
         return self.result
 
 
-async def run_in_thread(func, *args, **kwargs):
-    result = None
-    exception = None
+class ThreadPool:
+    """
+    A bounded set of reusable worker threads for blocking calls.
 
-    sender, receiver = socket.socketpair()
-    try:
-        def runner():
-            nonlocal result
-            nonlocal exception
+    Workers are started as needed, up to ``size``, and then kept around
+    waiting for more work.  Finished calls are handed back through a
+    single socketpair, which a reaper task (that only exists while there
+    are calls outstanding) waits on and dispatches from.
+    """
 
+    def __init__(self, size=4):
+        self.size = size
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.finished = collections.deque()
+        self.sender = self.receiver = None
+        self.reaper = None
+        self.workers = 0
+        self.idle = 0
+        self.outstanding = 0
+        self.completed = 0
+        self.max_queued = 0
+
+    def resize(self, size):
+        """Change the number of worker threads allowed; surplus workers
+        exit once they run out of work."""
+        with self.lock:
+            self.size = size
+            for i in range(self.workers - size):
+                self.jobs.put(None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'workers': self.workers,
+                'idle': self.idle,
+                'queued': self.jobs.qsize(),
+                'outstanding': self.outstanding,
+                'completed': self.completed,
+                'max_queued': self.max_queued,
+                }
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                if self.workers > self.size:
+                    self.workers -= 1
+                    return
+                self.idle += 1
+            job = self.jobs.get()
+            with self.lock:
+                self.idle -= 1
+            if job is None:
+                continue  # go see if we're surplus
+            func, args, kwargs, promise = job
             try:
-                result = func(*args, **kwargs)
+                result = (True, func(*args, **kwargs))
             except Exception as e:
-                exception = e
-
+                result = (False, e)
+            self.finished.append((promise, result))
             try:
-                sender.send(b'X')
+                self.sender.send(b'X')
             except Exception:  # pragma: nocover
                 pass
 
-        thread = threading.Thread(target=runner)
-
-        async def launcher():
-            # wait a tick, so the parent runs again and starts to sleep
-            await imbroglio.sleep()
-            thread.start()
+    async def _reap(self):
+        me = await imbroglio.this_task()
+        try:
+            while self.outstanding:
+                await imbroglio.readwait(self.receiver)
+                try:
+                    self.receiver.recv(4096)
+                except BlockingIOError:  # pragma: nocover
+                    pass
+                while self.finished:
+                    promise, (ok, value) = self.finished.popleft()
+                    with self.lock:
+                        self.outstanding -= 1
+                        self.completed += 1
+                    if ok:
+                        promise.set_result(value)
+                    else:
+                        promise.set_result_exception(value)
+        finally:
+            if self.reaper is me:
+                self.reaper = None
+
+    async def run(self, func, *args, **kwargs):
+        """Call func(*args, **kwargs) in a worker thread, returning (or
+        raising) what it does."""
+        if self.sender is None:
+            self.sender, self.receiver = socket.socketpair()
+            self.receiver.setblocking(False)
+
+        promise = Promise()
+        with self.lock:
+            self.outstanding += 1
+            self.jobs.put((func, args, kwargs, promise))
+            self.max_queued = max(self.max_queued, self.jobs.qsize())
+            start = self.idle < self.jobs.qsize() and self.workers < self.size
+            if start:
+                self.workers += 1
+        if start:
+            threading.Thread(target=self._worker, daemon=True).start()
+        # the pool outlives supervisors, and one can go away (say, on
+        # ^C) without its reaper finishing.  (Start the reaper without
+        # yielding in between, so that two calls can't both start one.)
+        supervisor = await imbroglio.get_supervisor()
+        reaper = self.reaper
+        if (reaper is None or reaper.is_done()
+                or reaper.supervisor is not supervisor):
+            self.reaper = supervisor.start(self._reap())
+
+        return await promise
+
+
+thread_pool = ThreadPool()
 
-        await imbroglio.spawn(launcher())
-        await imbroglio.readwait(receiver)
 
-        thread.join()
-        if exception is not None:
-            raise exception
-        return result
-    finally:
-        sender.close()
-        receiver.close()
+async def run_in_thread(func, *args, **kwargs):
+    return await thread_pool.run(func, *args, **kwargs)
 
 
 async def process_filter(cmd, inbuf):
     inr, inw = os.pipe()
     outr, outw = os.pipe()
+    closed = set()
+
+    def close(fd):
+        # only once, lest we close someone else's fd that reused the number
+        if fd not in closed:
+            closed.add(fd)
+            os.close(fd)
 
     async def sender(inbuf):
         inbuf = inbuf.encode()
@@ -197,7 +293,7 @@ async def process_filter(cmd, inbuf):
             await imbroglio.writewait(inw)
             count = os.write(inw, inbuf)
             inbuf = inbuf[count:]
-        os.close(inw)
+        close(inw)
 
     try:
         for fd in (inw, outr):
@@ -225,11 +321,11 @@ async def process_filter(cmd, inbuf):
             return retval, b''.join(output).decode(errors='replace')
     finally:
         try:
-            os.close(inw)
-        except OSError:
+            close(inw)
+        except OSError:  # pragma: nocover
             pass
         try:
-            os.close(outr)
+            close(outr)
         except OSError:  # pragma: nocover
             pass
 
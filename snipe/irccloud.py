@@ -47,6 +47,7 @@ from . import imbroglio
 from . import interactive
 from . import keymap
 from . import messages
+from . import sortedlist
 from . import text
 from . import util
 
@@ -80,7 +81,7 @@ class IRCCloud(messages.SnipeBackend, util.HTTP_JSONmixin):
 
         self.reqid_counter = itertools.count()
 
-        self.messages = []
+        self.messages = sortedlist.SortedList()
         self.connections = {}
         self.buffers = {}
         self.channels = {}
@@ -278,13 +279,16 @@ class IRCCloud(messages.SnipeBackend, util.HTTP_JSONmixin):
             if self.message_set and float(msg) in self.message_set:
                 self.log.debug(f'dropping {float(msg)} {msg!r}')
                 return
+            # the sender is computed lazily, so work these out before the
+            # message is kept: an unknown cid raises here, not on display
+            reply, followup = msg.reply(), msg.followup()
             msglist.append(msg)
             if len(msglist) > 1 and msglist[-1] < msglist[-2]:
                 msglist.sort()
             # really this should come from the current channel membership
-            self._destinations.add(msg.reply())
-            self._destinations.add(msg.followup())
-            self._senders.add(msg.reply())
+            self._destinations.add(reply)
+            self._destinations.add(followup)
+            self._senders.add(reply)
             return msg
         return None
 
@@ -295,9 +299,8 @@ class IRCCloud(messages.SnipeBackend, util.HTTP_JSONmixin):
             # should make an error-message
             self.log.error('failed {m}')
             return
-        self.drop_cache()
         if msg is not None:
-            self.redisplay(msg, msg)
+            self.ingest([msg], added=True)
 
     async def include(self, url):
         self.log.debug('including %s', url)
@@ -319,7 +322,7 @@ class IRCCloud(messages.SnipeBackend, util.HTTP_JSONmixin):
             included.sort()
 
             if included:
-                self.messages = list(messages.merge([self.messages, included]))
+                self.messages.merge(included)
                 self.drop_cache()
                 self.redisplay(included[0], included[-1])
         finally:
@@ -496,8 +499,7 @@ class IRCCloud(messages.SnipeBackend, util.HTTP_JSONmixin):
                     if included:
                         self.log.debug('merging %d messages', len(included))
                         l = len(self.messages)
-                        self.messages = list(messages.merge(
-                            [self.messages, included]))
+                        self.messages.merge(included)
                         self.log.debug(
                             'len(self.messages): %d -> %d',
                             l, len(self.messages))
@@ -538,6 +540,10 @@ class IRCCloud(messages.SnipeBackend, util.HTTP_JSONmixin):
 
 
 class IRCCloudMessage(messages.SnipeMessage):
+    __slots__ = ('channel', 'unformatted')
+    # fields that take the same few values over and over
+    INTERN = ('type', 'from', 'nick', 'from_name', 'from_host', 'chan')
+
     def __init__(self, backend, m):
         when = m.get('eid', -1)
         if when == -1:
@@ -547,28 +553,8 @@ class IRCCloudMessage(messages.SnipeMessage):
 
         mtype = m.get('type')
 
-        body = m.get('msg', repr(m))
-        if mtype == 'motd_response':
-            body = '\n'.join([m['start']] + m['lines'] + [body])
-
-        super().__init__(backend, body, when)
-        self.data = m
-        if 'from' in m and 'from_name' in m and 'from_host' in m:
-            self._sender = IRCCloudUser(
-                backend,
-                backend.connections[m['cid']]['hostname'],
-                m['from'],
-                m['from_name'],
-                m['from_host'])
-        elif 'nick' in m and 'from_name' in m and 'from_host' in m:
-            self._sender = IRCCloudUser(
-                backend,
-                backend.connections[m['cid']]['hostname'],
-                m['nick'],
-                m['from_name'],
-                m['from_host'])
-        else:
-            self._sender = IRCCloudNonAddress(backend, 'system')
+        super().__init__(backend, None, when)
+        self.data = util.intern_values(m, self.INTERN)
 
         self.channel = self.backend.buffers.get(
             self.data.get('bid', -1), {}).get('name', None)
@@ -595,6 +581,32 @@ class IRCCloudMessage(messages.SnipeMessage):
             'banned',
             )
 
+    def make_body(self):
+        m = self.data
+        body = m.get('msg', repr(m))
+        if m.get('type') == 'motd_response':
+            body = '\n'.join([m['start']] + m['lines'] + [body])
+        return body
+
+    def make_sender(self):
+        m = self.data
+        if 'from' in m and 'from_name' in m and 'from_host' in m:
+            return IRCCloudUser(
+                self.backend,
+                self.backend.connections[m['cid']]['hostname'],
+                m['from'],
+                m['from_name'],
+                m['from_host'])
+        elif 'nick' in m and 'from_name' in m and 'from_host' in m:
+            return IRCCloudUser(
+                self.backend,
+                self.backend.connections[m['cid']]['hostname'],
+                m['nick'],
+                m['from_name'],
+                m['from_host'])
+        else:
+            return IRCCloudNonAddress(self.backend, 'system')
+
     def __repr__(self):
         return (
             '<' + self.__class__.__name__ + ' '
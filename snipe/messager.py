@@ -148,18 +148,35 @@ class Messager(window.Window, window.PagingMixIn):
     def view(self, origin, forward=True):
         self.log.debug('view(%s, %s)', repr(origin), repr(forward))
 
+        # named filters the rules refer to can be edited without bumping
+        # the configuration generation
+        named = tuple(sorted(self.context.conf.get('filter', {}).items()))
+
         for x in self.msg_walk(origin, forward):
             chunk = None
             try:
-                decoration: Dict[str, str] = {}
-                for filt, decor in self.rules:
-                    if filt(x):
-                        decoration.update(decor)
-                chunk = x.display(decoration)
-
-                if not chunk:
-                    # this is a bug so it will do the wrong thing sometimes
-                    chunk = chunks.Chunk([((), '\n')])
+                # messages only need decorating again if they, the rules,
+                # the configuration or their backend have changed
+                key = (
+                    self.rules_key,
+                    named,
+                    util.Configurable.generation,
+                    x.backend.display_generation,
+                    )
+                if x.rendered is not None and x.rendered[0] == key:
+                    chunk = x.rendered[1]
+                else:
+                    decoration: Dict[str, str] = {}
+                    for filt, decor in self.rules:
+                        if filt(x):
+                            decoration.update(decor)
+                    chunk = x.display(decoration)
+
+                    if not chunk:
+                        # this is a bug so it will do the wrong thing
+                        # sometimes
+                        chunk = chunks.Chunk([((), '\n')])
+                    x.rendered = (key, chunk)
 
                 if self.search_re is not None:
                     chunk = chunk.mark_re(self.search_re, chunk.tag_reverse)
@@ -553,12 +570,20 @@ class Messager(window.Window, window.PagingMixIn):
                 # it would actually be testable
                 self.log.exception(
                     'error in filter %s for decor %s', filt, decor)
+        self.rules_changed()
+
+    def rules_changed(self):
+        # windows with the same rules can use each other's renderings
+        self.rules_key = tuple(
+            (str(filt), repr(sorted(decor.items())))
+            for (filt, decor) in self.rules)
 
     def filter_clear_decorate(self, decoration):
         self.rules = [
             (filt, decor)
             for (filt, decor) in self.rules if filt != self.filter]
         self.rules.append((self.filter, decoration))
+        self.rules_changed()
         self.context.conf['rule'] = [
             (filts, decor)
             for (filts, decor) in self.context.conf.get('rule', [])
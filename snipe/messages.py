@@ -34,13 +34,15 @@ Utilities and base classes for dealin with messages.
 '''
 
 
-import bisect
+import collections
 import contextlib
 import datetime
 import enum
 import functools
+import inspect
 import logging
 import math
+import os
 import time
 
 from typing import (List, Optional, Sequence, Union)
@@ -48,6 +50,8 @@ from typing import (List, Optional, Sequence, Union)
 from . import chunks
 from . import filters
 from . import imbroglio
+from . import sortedlist
+from . import store
 from . import text
 from . import util
 
@@ -84,12 +88,14 @@ class SnipeAddress:
 
 @functools.total_ordering
 class SnipeMessage:
-    personal = False
-    outgoing = False
-    noise = False
-    omega = False
-    error = False
-    transformed = None
+    # There can be a great many of these, so they don't get a __dict__;
+    # subclasses should list any attributes they add in their own
+    # __slots__.
+    __slots__ = (
+        'backend', 'time', '_body', 'data', '_sender',
+        'personal', 'outgoing', 'noise', 'omega', 'error', 'transformed',
+        'rendered', 'fields',
+        )
 
     def __init__(self, backend, body='', mtime=None):
         self._sender = None
@@ -97,13 +103,47 @@ class SnipeMessage:
         self.time = time.time() if mtime is None else mtime
         self.body = body
         self.data = {}
+        self.personal = False
+        self.outgoing = False
+        self.noise = False
+        self.omega = False
+        self.error = False
+        self.transformed = None
+        # (key, chunk) from the last time a window displayed this message
+        self.rendered = None
+        # (backend display_generation, raw fields, canonical fields),
+        # filled in as filters and the like ask for them
+        self.fields = None
 
     @property
     def sender(self):
         if self._sender is None:
-            self._sender = SnipeAddress(self.backend)
+            self._sender = self.make_sender()
         return self._sender
 
+    def make_sender(self):
+        """Return the address of the sender of the message, which is only
+        worked out when someone asks."""
+
+        return SnipeAddress(self.backend)
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = self.make_body()
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    def make_body(self):
+        """Return the body of the message, for messages constructed with
+        a body of ``None``; it's worked out when first needed, and again
+        if it's set back to ``None``."""
+
+        return ''
+
     def __str__(self):
         return '%s %s\n%s' % (
             time.strftime('%H:%M', time.localtime(self.time)),
@@ -136,7 +176,29 @@ class SnipeMessage:
     def canon(field, value):
         return value
 
+    def field_table(self, canon=True):
+        """Return the dictionary of the message's (canonicalized, if
+        ``canon``) field values worked out so far.
+
+        The tables are thrown away when the message changes or when
+        something its backend displays everything in terms of (user
+        names, say) does."""
+
+        generation = getattr(self.backend, 'display_generation', None)
+        fields = self.fields
+        if fields is None or fields[0] != generation:
+            fields = self.fields = (generation, {}, {})
+        return fields[2 if canon else 1]
+
     def field(self, name, canon=True):
+        table = self.field_table(canon)
+        try:
+            return table[name]
+        except KeyError:
+            val = table[name] = self.field_compute(name, canon)
+            return val
+
+    def field_compute(self, name, canon=True):
         val = getattr(self, name, None)
         if val is None:
             val = self.data.get(name, None)
@@ -152,6 +214,91 @@ class SnipeMessage:
             val = ''
         return val
 
+    @classmethod
+    def field_tables(cls):
+        """Return whether ``field`` just reads (and fills in) the tables
+        ``field_table`` returns, so a getter can look in them directly."""
+
+        return (
+            cls.field is SnipeMessage.field
+            and cls.field_table is SnipeMessage.field_table)
+
+    @classmethod
+    def field_getter(cls, name, canon=True):
+        """Return a function equivalent to ``m.field(name, canon)`` for
+        messages of this class, with the canonicalization resolved up front.
+        """
+
+        if not cls.field_tables():
+            return lambda m: m.field(name, canon)
+
+        if cls.field_compute is not SnipeMessage.field_compute:
+            compute = cls.field_compute
+        else:
+            compute = cls._field_computer(name, canon)
+        index = 2 if canon else 1
+
+        def getter(m):
+            fields = m.fields
+            if (fields is not None and fields[0] == getattr(
+                    m.backend, 'display_generation', None)):
+                table = fields[index]
+                if name in table:
+                    return table[name]
+            else:
+                table = m.field_table(canon)
+            val = table[name] = compute(m, name, canon)
+            return val
+
+        return getter
+
+    @classmethod
+    def _field_computer(cls, name, canon):
+        # field_compute, specialized for this class and field
+
+        method = inspect.getattr_static(cls, 'canon')
+        static = isinstance(method, staticmethod)
+        if static:
+            if method is SnipeMessage.__dict__['canon']:
+                canon = False  # the identity
+            method = method.__func__
+
+        # Most fields live in the data dict; don't pay for the AttributeError
+        # when neither the class nor (maybe) the instance has the attribute.
+        missing = object()
+        attribute = (
+            inspect.getattr_static(cls, name, missing) is not missing
+            or inspect.getattr_static(cls, '__getattr__', None) is not None)
+        instance = cls.__dictoffset__ != 0
+
+        def compute(m, name, _canon):
+            if attribute:
+                val = getattr(m, name, None)
+            elif instance:
+                val = m.__dict__.get(name)
+            else:
+                val = None
+            if val is None:
+                val = m.data.get(name, None)
+
+            if val.__class__ is str:
+                pass
+            elif hasattr(val, '__int__'):
+                val = int(val)
+            elif val is not True and val is not False and val is not None:
+                val = str(val)
+
+            if canon and val is not None:
+                if static:
+                    val = method(name, val)
+                else:
+                    val = method(m, name, val)
+            if val is None:
+                val = ''
+            return val
+
+        return compute
+
     @staticmethod
     def _coerce(other):
         if hasattr(other, 'time'):
@@ -195,6 +342,15 @@ class SnipeMessage:
     def transform(self, encoding, body):
         self.transformed = encoding
         self.body = body
+        self.changed()
+
+    def changed(self):
+        """Note that the message has been edited, so that it gets decorated
+        afresh the next time it's displayed and its fields are worked out
+        again."""
+
+        self.rendered = None
+        self.fields = None
 
     class Decor:
         @classmethod
@@ -278,6 +434,8 @@ class SnipeMessage:
 
 
 class SnipeErrorMessage(SnipeMessage):
+    __slots__ = ()
+
     def __init__(self, backend, body, tb=None):
         super().__init__(backend, body)
         self.error = True
@@ -304,6 +462,24 @@ class BackendState(enum.Enum):
     DISCONNECTED = enum.auto()
 
 
+def accept(m):
+    """The filter for walks without one."""
+    return True
+
+
+class FilterIndex(sortedlist.SortedList):
+    """The messages in a backend that match a filter.
+
+    It's filled in by SnipeBackend.index_build and kept up to date by
+    SnipeBackend.cache_added; walk only uses it once it is ``ready``.
+    """
+
+    def __init__(self, mfilter):
+        super().__init__()
+        self.mfilter = mfilter
+        self.ready = False
+
+
 class SnipeBackend:
     # name of concrete backend
     name: Optional[str] = None
@@ -314,11 +490,46 @@ class SnipeBackend:
 
     AUTO_FILL = True
     SOFT_NEWLINES = False
+    # the number of walk starting points to remember
+    STARTCACHE_MAX = 4096
+    # how many filters to keep indexes of, how many messages a backend
+    # needs before it's worth it, and how many messages to index between
+    # switches
+    INDEX_MAX = 8
+    INDEX_THRESHOLD = 4096
+    INDEX_SLICE = 1024
+    # how many simplified filters to remember
+    SIMPLIFY_MAX = 64
+    # whether message_restore can rebuild messages from the local store
+    STORABLE = False
+    # bumped when something every message's display depends on (user
+    # names, say) changes
+    display_generation = 0
+    # how long (in seconds) to hold on to newly arrived messages, and at
+    # most how many, so that a burst is merged and displayed all at once
+    INGEST_WINDOW = .05
+    INGEST_MAX = 256
+    # how many messages before the earliest one being looked at are kept
+    # resident regardless of resident_max
+    RESIDENT_MARGIN = 1024
 
     indent = util.Configurable(
         'message.indent_body_string', '',
         'Indent message bodies with this string (barnowl expats may '
         'wish to set it to eight spaces)')
+    persist = util.Configurable(
+        'message.persist', False,
+        'Keep a copy of messages under the snipe directory so that they'
+        ' need not be fetched again at startup (for backends that support'
+        ' it)',
+        coerce=util.coerce_bool)
+    resident_max = util.Configurable(
+        'message.resident_max', 0,
+        'Keep at most (about) this many messages in memory per backend,'
+        ' or 0 for no limit.  Older messages are dropped and reloaded from'
+        ' the local store as needed, so this only applies to backends with'
+        ' message.persist turned on.',
+        coerce=int)
 
     def __init__(self, context, name=None, conf={}):
         self.context = context
@@ -329,11 +540,18 @@ class SnipeBackend:
         logname += '.%x' % (id(self),)
         self.log = logging.getLogger(logname)
         self.conf = conf
+        self.ingest_queue = []
+        self.ingest_span = None
+        self.ingest_task = None
+        self.simplified = collections.OrderedDict()
+        # both edges of each gap in self.messages, by time
+        self.gaps = {}
         self.drop_cache()
         self.tasks = []
         self._destinations = set()
         self._senders = set()
         self._state = BackendState.IDLE
+        self.store = None
 
     def state(self):
         return self._state
@@ -346,10 +564,394 @@ class SnipeBackend:
         """Actually connect to whatever we're connecting to and start
         retrieving messages."""
         self.supervisor = await imbroglio.get_supervisor()
+        self.store_open()
+
+    def store_open(self):
+        """Open the local message store, if it's turned on and this backend
+        knows how to rebuild its messages from it."""
+
+        if self.store is not None or not (self.STORABLE and self.persist):
+            return
+        self.context.ensure_directory()
+        self.store = store.MessageStore(
+            os.path.join(self.context.directory, 'store', self.name))
+        self.log.debug('opened %s', repr(self.store))
+
+    def store_add(self, msgs):
+        if self.store is None:
+            return
+        self.store.add_many(
+            (m.time, self.message_key(m), self.message_data(m)) for m in msgs)
+
+    async def store_before(self, mtime, count):
+        """Rebuild up to ``count`` stored messages from before ``mtime``,
+        oldest first."""
+
+        if self.store is None:
+            return []
+        ms = []
+        for (t, data) in self.store.before(mtime, count):
+            m = await self.message_restore(data)
+            m.time = t
+            ms.append(m)
+        return ms
+
+    def stored_before(self, mtime):
+        """Return how many stored messages there are from before
+        ``mtime``."""
+
+        if self.store is None:
+            return 0
+        return self.store.count_before(mtime)
+
+    def hot_times(self):
+        """Return the times of the messages someone might be looking at:
+        the windows' cursors and the starks."""
+
+        times = list(getattr(self.context, 'starks', ()))
+        for w in getattr(self.context.ui, 'windows', ()):
+            window = getattr(w, 'window', None)
+            for m in (getattr(window, 'cursor', None),
+                      getattr(window, 'secondary', None)):
+                if isinstance(m, SnipeMessage):
+                    times.append(m.time)
+        return times
+
+    def evict(self):
+        """Drop the oldest resident messages if there are more than
+        ``resident_max`` of them, returning how many were dropped.
+
+        Only messages that are in the local store (and so can be brought
+        back by backfilling) are dropped, and only from before the
+        earliest of the ``hot_times`` (less ``RESIDENT_MARGIN`` messages).
+        """
+
+        limit = self.resident_max
+        if not limit or self.store is None or len(self.messages) <= limit:
+            return 0
+        if self._state == BackendState.BACKFILLING:
+            # it's filling in what someone is on their way to
+            return 0
+
+        # go down to three quarters so this doesn't happen on every flush
+        count = len(self.messages) - (limit - limit // 4)
+        first = self.messages[0].time
+        hot = [t for t in self.hot_times() if t >= first]
+        if hot:
+            floor = sortedlist.bisect_left(self.messages, min(hot))
+            count = min(count, floor - self.RESIDENT_MARGIN)
+        for (i, m) in enumerate(self.messages[:max(count, 0)]):
+            if self.message_key(m) not in self.store:
+                count = i
+                break
+        if count <= 0:
+            return 0
+
+        self.log.debug('evicting %d of %d messages', count, len(self.messages))
+        if isinstance(self.messages, sortedlist.SortedList):
+            self.messages.drop_head(count)
+        else:
+            del self.messages[:count]
+        for gap in set(self.gaps.values()):
+            if gap[0] < self.messages[0].time:
+                self.gap_remove(gap)
+        self.drop_cache()
+        return count
+
+    def gap_add(self, older, newer):
+        """Note that messages from between the resident ones at ``older`` and
+        ``newer`` are missing."""
+
+        gap = (older, newer)
+        self.gaps[older] = self.gaps[newer] = gap
+
+    def gap_remove(self, gap):
+        for t in gap:
+            if self.gaps.get(t) == gap:
+                del self.gaps[t]
+
+    def fill_gap(self, gap):
+        """Start filling in ``gap``, which a walk has reached the edge of."""
+        pass
+
+    def message_key(self, msg):
+        """Return the backend's unique id for a message, or None if the
+        message shouldn't be stored."""
+        return msg.data.get('id')
+
+    def message_data(self, msg):
+        """Return the JSON-able data message_restore needs."""
+        return msg.data
+
+    async def message_restore(self, data):
+        """Rebuild a message from what message_data returned."""
+        raise NotImplementedError
 
     def drop_cache(self):
+        self.indexes = collections.OrderedDict()
+        self.drop_walk_cache()
+
+    def drop_walk_cache(self):
         self.startcache = {}
         self.adjcache = {}
+        # cached positions are relative to cache_base, so that prepending
+        # messages only has to bump it
+        self.cache_base = 0
+        # cache keys whose answers run into the end (tail) or the beginning
+        # (head) of the message list, and so are all that change when
+        # messages are added there
+        self.tailstarts = set()
+        self.tailadjs = set()
+        self.headstarts = set()
+        self.headadjs = set()
+
+    def cache_start(self, key, point):
+        if len(self.startcache) >= self.STARTCACHE_MAX:
+            self.startcache = {}
+            self.tailstarts = set()
+            self.headstarts = set()
+        self.startcache[key] = point - self.cache_base
+        start, forward, _ = key
+        if forward:
+            if not self.messages[0] < start:
+                self.headstarts.add(key)
+        elif not self.messages[-1] > start:
+            self.tailstarts.add(key)
+
+    def cache_adj(self, key, point):
+        self.adjcache[key] = point - self.cache_base
+        if point < 0:
+            self.headadjs.add(key)
+        elif point >= len(self.messages):
+            self.tailadjs.add(key)
+        else:
+            self.headadjs.discard(key)
+            self.tailadjs.discard(key)
+
+    def cache_added(self, msgs):
+        """Bring the walk caches up to date after the (sorted) messages in
+        ``msgs`` have been added to ``self.messages``.
+
+        If they went on either end only the cache entries that ran into that
+        end are revisited, otherwise the caches are dropped.
+        """
+
+        if not msgs:
+            return
+        n, k = len(self.messages), len(msgs)
+        if k > n:
+            self.drop_cache()
+            return
+        for mfilter, index in self.indexes.items():
+            check = filters.compiled(mfilter)
+            matched = [m for m in msgs if check(m)]
+            if index and matched and matched[-1] < index[0]:
+                index.prepend(matched)
+            else:
+                index.extend(matched)
+        if self.messages[n - k] is msgs[0] and self.messages[-1] is msgs[-1]:
+            self._cache_tail(n - k)
+        elif self.messages[0] is msgs[0] and self.messages[k - 1] is msgs[-1]:
+            self.cache_base += k
+            self._cache_head(k)
+        else:
+            self.drop_walk_cache()
+
+    def newest(self):
+        """Return the newest message, including ones still waiting to be
+        ingested, or None."""
+
+        if self.ingest_queue:
+            return self.ingest_queue[-1]
+        if self.messages:
+            return self.messages[-1]
+        return None
+
+    def ingest(self, msgs, added=False):
+        """Take delivery of newly arrived (sorted) messages.
+
+        They are held for up to ``INGEST_WINDOW`` seconds (or until
+        ``INGEST_MAX`` have piled up) and then merged into ``self.messages``
+        together, with one store, cache and redisplay update for the lot.
+        If ``added``, the backend has already put them in ``self.messages``,
+        where a walk can find them, so the caches are brought up to date
+        straight away and only the redisplay is deferred.
+        """
+
+        if not msgs:
+            return
+        if added:
+            self.cache_added(msgs)
+        else:
+            self.ingest_queue.extend(msgs)
+        if self.ingest_span is None:
+            self.ingest_span = (msgs[0], msgs[-1])
+        else:
+            first, last = self.ingest_span
+            self.ingest_span = (min(first, msgs[0]), max(last, msgs[-1]))
+
+        supervisor = getattr(self, 'supervisor', None)
+        if len(self.ingest_queue) >= self.INGEST_MAX or supervisor is None:
+            self.ingest_flush()
+        elif self.ingest_task is None:
+            self.reap_tasks()
+            self.ingest_task = supervisor.start(self.ingest_later())
+            self.tasks.append(self.ingest_task)
+
+    async def ingest_later(self):
+        try:
+            await imbroglio.sleep(self.INGEST_WINDOW)
+        finally:
+            self.ingest_task = None
+        self.ingest_flush()
+
+    def ingest_flush(self):
+        """Merge in whatever ``ingest`` has been holding on to, now."""
+
+        queued, self.ingest_queue = self.ingest_queue, []
+        span, self.ingest_span = self.ingest_span, None
+        if span is None:
+            return
+
+        if queued:
+            queued.sort()
+            if isinstance(self.messages, sortedlist.SortedList):
+                if self.messages.merge(queued) != len(queued):
+                    # drop the ones that were already there
+                    queued = [
+                        m for m in queued
+                        if self.messages[self.messages.bisect_left(m)] is m]
+            else:
+                tail = self.messages[-1] if self.messages else None
+                self.messages.extend(queued)
+                if tail is not None and queued[0] < tail:
+                    self.messages.sort()
+            self.store_add(queued)
+
+        self.cache_added(queued)
+        self.evict()
+        self.redisplay(*span)
+
+    def _cache_tail(self, first):
+        base, end = self.cache_base, len(self.messages)
+        for key in list(self.tailadjs):
+            check = filters.compiled(key[2])
+            for i in range(first, end):
+                if check(self.messages[i]):
+                    self.adjcache[key] = i - base
+                    self.tailadjs.discard(key)
+                    break
+            else:
+                self.adjcache[key] = end - base
+        for key in list(self.tailstarts):
+            start, _, mfilter = key
+            check = filters.compiled(mfilter)
+            for i in range(end - 1, first - 1, -1):
+                m = self.messages[i]
+                if not m > start and check(m):
+                    self.startcache[key] = i - base
+                    break
+            if self.messages[-1] > start:
+                self.tailstarts.discard(key)
+
+    def _cache_head(self, count):
+        base = self.cache_base
+        for key in list(self.headadjs):
+            check = filters.compiled(key[2])
+            for i in range(count - 1, -1, -1):
+                if check(self.messages[i]):
+                    self.adjcache[key] = i - base
+                    self.headadjs.discard(key)
+                    break
+            else:
+                self.adjcache[key] = -1 - base
+        for key in list(self.headstarts):
+            start, _, mfilter = key
+            check = filters.compiled(mfilter)
+            for i in range(count):
+                m = self.messages[i]
+                if not m < start and check(m):
+                    self.startcache[key] = i - base
+                    break
+            if self.messages[0] < start:
+                self.headstarts.discard(key)
+
+    def simplify(self, mfilter):
+        """Return ``mfilter`` simplified for this backend.
+
+        The same filter object comes back for as long as the settings and
+        the text of any named filters it refers to stay the same, so that
+        the filter's memoized results and the walk caches keyed on it
+        carry over from one walk to the next."""
+
+        key = (mfilter, self.name, util.Configurable.generation)
+        section = self.context.conf.get('filter', {})
+        cached = self.simplified.get(key)
+        if cached is not None:
+            texts, result = cached
+            if all(section.get(name) == text for (name, text) in texts):
+                self.simplified.move_to_end(key)
+                return result
+
+        d = {'backend': self.name, 'context': self.context}
+        result = mfilter.simplify(d)
+        texts = [
+            (name, section.get(name)) for name in d.get('filterlookup', ())]
+        self.simplified.pop(key, None)
+        while len(self.simplified) >= self.SIMPLIFY_MAX:
+            self.simplified.popitem(last=False)
+        self.simplified[key] = (texts, result)
+        return result
+
+    def filter_index(self, mfilter):
+        """Return the index of messages matching ``mfilter`` if there is a
+        usable one, starting to build one if it looks worthwhile."""
+
+        if mfilter is accept:
+            return None
+        index = self.indexes.get(mfilter)
+        if index is not None:
+            self.indexes.move_to_end(mfilter)
+            return index if index.ready else None
+        supervisor = getattr(self, 'supervisor', None)
+        if len(self.messages) < self.INDEX_THRESHOLD or supervisor is None:
+            return None
+        if len(self.indexes) >= self.INDEX_MAX:
+            self.indexes.popitem(last=False)
+        index = self.indexes[mfilter] = FilterIndex(mfilter)
+        self.reap_tasks()
+        self.tasks.append(
+            supervisor.start(self.index_build(index, list(self.messages))))
+        return None
+
+    async def index_build(self, index, snapshot):
+        """Fill in ``index`` from a snapshot of the message list.
+
+        Messages that arrive in the meantime are added by cache_added.
+        """
+
+        check = filters.compiled(index.mfilter)
+        with util.stopwatch('indexing %d messages' % len(snapshot), self.log):
+            for i in range(0, len(snapshot), self.INDEX_SLICE):
+                if self.indexes.get(index.mfilter) is not index:
+                    return  # dropped
+                for m in snapshot[i:i + self.INDEX_SLICE]:
+                    if check(m):
+                        index.add(m)
+                await imbroglio.switch()
+        index.ready = True
+        self.log.debug('%d messages match %s', len(index), index.mfilter)
+
+    @staticmethod
+    def startpoint(seq, start, forward):
+        """Find where a walk from ``start`` begins in a sorted sequence."""
+
+        left = sortedlist.bisect_left(seq, start)
+        right = sortedlist.bisect_right(seq, start)
+        try:
+            return seq.index(start, left, right)
+        except ValueError:
+            return left if forward else right - 1
 
     def walk(
             self, start: Union[SnipeMessage, float], forward=True,
@@ -387,21 +989,32 @@ class SnipeBackend:
         # weird message list behavior, this might be why...)
 
         if mfilter is not None:
-            mfilter = mfilter.simplify({
-                'backend': self.name,
-                'context': self.context,
-                })
+            mfilter = self.simplify(mfilter)
             if mfilter is False:
                 return
             if mfilter is True:
                 mfilter = None
 
         if mfilter is None:
-            def mfilter(m):
-                return True
+            mfilter = accept
+
+        index = self.filter_index(mfilter)
+        if index is not None:
+            if backfill_to is not None and math.isfinite(backfill_to):
+                self.backfill(mfilter, backfill_to)
+            step = 1 if forward else -1
+            point = self.startpoint(index, start, forward)
+            while 0 <= point < len(index):
+                yield index[point]
+                point += step
+            if point < 0 and backfill_to is not None:
+                self.backfill(mfilter, backfill_to)
+            return
 
         cachekey = (start, forward, mfilter)
         point = self.startcache.get(cachekey, None)
+        if point is not None:
+            point += self.cache_base
 
         if backfill_to is not None and math.isfinite(backfill_to):
             self.backfill(mfilter, backfill_to)
@@ -409,17 +1022,7 @@ class SnipeBackend:
         needcache = False
         if point is None:
             needcache = True
-            left = bisect.bisect_left(self.messages, start)
-            right = bisect.bisect_right(self.messages, start)
-            try:
-                point = self.messages.index(start, left, right)
-            except ValueError:
-                point = None
-
-            if forward:
-                point = point if point is not None else left
-            else:
-                point = point if point is not None else right - 1
+            point = self.startpoint(self.messages, start, forward)
 
         if forward:
             def getnext(x):
@@ -431,24 +1034,35 @@ class SnipeBackend:
         # self.log.debug(
         #     'len(self.messages)=%d, point=%d', len(self.messages), point)
 
+        check = filters.compiled(mfilter)
         adjkey = None
         while self.messages:
             # self.log.debug(', point=%d', point)
             if not 0 <= point < len(self.messages):
                 break
             m = self.messages[point]
-            if mfilter(m):
-                if needcache:
-                    self.startcache[cachekey] = point
-                    needcache = False
-                yield m
-                if adjkey is not None:
-                    self.adjcache[adjkey] = point
-                adjkey = (m, forward, mfilter)
-            point = self.adjcache.get(adjkey, getnext(point))
+            if not check(m):
+                point = getnext(point)
+                continue
+            if needcache:
+                self.cache_start(cachekey, point)
+                needcache = False
+            yield m
+            if self.gaps and not search:
+                gap = self.gaps.get(m.time)
+                if gap is not None:
+                    self.fill_gap(gap)
+            if adjkey is not None:
+                self.cache_adj(adjkey, point)
+            adjkey = (m, forward, mfilter)
+            cached = self.adjcache.get(adjkey)
+            if cached is None:
+                point = getnext(point)
+            else:
+                point = cached + self.cache_base
 
         if adjkey is not None:
-            self.adjcache[adjkey] = point
+            self.cache_adj(adjkey, point)
 
         # specifically catch the situation where we're trying to go off the top
         if point < 0 and backfill_to is not None:
@@ -474,6 +1088,7 @@ class SnipeBackend:
         pass
 
     async def shutdown(self):
+        self.ingest_flush()
         tasks = list(reversed(self.tasks))
         for t in tasks:
             self.log.error('shutting down %s', repr(t))
@@ -485,6 +1100,9 @@ class SnipeBackend:
             except BaseException:
                 self.log.exception('while shutting down')
         self.tasks = []
+        if self.store is not None:
+            self.store.close()
+            self.store = None
 
     def reap_tasks(self):
         """Remove any tasks that have completed.
@@ -506,9 +1124,17 @@ class SnipeBackend:
         return self.name
 
     def count(self):
-        """Return the number of messages stored (locally) in this backend."""
+        """Return the number of messages resident in this backend."""
         return len(self.messages)
 
+    def count_total(self):
+        """Return the number of messages this backend knows about, resident
+        or only in the local store."""
+
+        if not self.messages:
+            return len(self.store) if self.store is not None else 0
+        return len(self.messages) + self.stored_before(self.messages[0].time)
+
     async def send(self, recipient, body):
         """Send a message"""
         raise NotImplementedError('No such recipient')
@@ -534,11 +1160,14 @@ class SinkBackend(SnipeBackend):
         self.messages = []
 
     async def send(self, recipient, body):
-        self.messages.append(SnipeMessage(self, body))
-        self.drop_cache()
+        m = SnipeMessage(self, body)
+        self.messages.append(m)
+        self.cache_added([m])
 
 
 class InfoMessage(SnipeMessage):
+    __slots__ = ()
+
     def __str__(self):
         return self.body
 
@@ -791,6 +1420,9 @@ class AggregatorBackend(SnipeBackend):
     def count(self):
         return sum(backend.count() for backend in self.backends)
 
+    def count_total(self):
+        return sum(backend.count_total() for backend in self.backends)
+
     def destinations(self):
         return set().union(
             *(backend.destinations() for backend in self.backends))
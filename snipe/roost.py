@@ -36,6 +36,7 @@ Backend for talking to `roost <https://github.com/roost-im>`_
 
 import codecs
 import contextlib
+import functools
 import getopt
 import inspect
 import itertools
@@ -54,6 +55,7 @@ from . import interactive
 from . import imbroglio
 from . import keymap
 from . import messages
+from . import sortedlist
 from . import util
 from . import zcode
 
@@ -63,6 +65,7 @@ _backend = 'Roost'
 
 class Roost(messages.SnipeBackend):
     name = 'roost'
+    STORABLE = True
 
     backfill_count = util.Configurable(
         'roost.backfill_count', 8,
@@ -104,11 +107,12 @@ class Roost(messages.SnipeBackend):
 
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
-        self.messages = []
+        self.messages = sortedlist.SortedList()
         self.r = _rooster.Rooster(self.url, self.service_name)
         self.chunksize = 128
         self.loaded = False
         self.backfilling = False
+        self.filling = set()
         self.connected = False
         self._destinations = set()
         self._zephyr_subs = os.path.join(
@@ -116,11 +120,17 @@ class Roost(messages.SnipeBackend):
 
     async def start(self):
         await super().start()
+        if self.store is not None and not self.messages:
+            # new_messages picks up after the last one of these
+            ms = await self.store_before(float('inf'), self.chunksize)
+            self.messages.prepend(ms)
+            self.cache_added(ms)
         self.new_task = await imbroglio.spawn(self.new_messages())
         self.tasks.append(self.new_task)
 
     async def new_messages(self):
         while True:
+            self.ingest_flush()
             for m in reversed(self.messages):
                 start = m.data.get('id')
                 if start is not None:
@@ -267,11 +277,13 @@ class Roost(messages.SnipeBackend):
         await imbroglio.switch()
 
     def add_message(self, msg):
-        if self.messages and msg.time <= self.messages[-1].time:
-            msg.time = self.messages[-1].time + .00001
-        self.messages.append(msg)
-        self.drop_cache()
-        self.redisplay(msg, msg)
+        newest = self.newest()
+        if newest is not None and msg.time <= newest.time:
+            msg.time = newest.time + .00001
+        self.ingest([msg])
+
+    async def message_restore(self, data):
+        return (await self.construct_and_maybe_decrypt(data))
 
     async def construct_and_maybe_decrypt(self, m):
         msg = RoostMessage(self, m)
@@ -304,7 +316,11 @@ class Roost(messages.SnipeBackend):
             util.timestr(target), count, util.timestr(origin))
 
         # if we're not gettting new messages, don't try to get old ones
-        if not self.connected or self.loaded or target is None:
+        if not self.connected or target is None:
+            return
+        # messages that were evicted can still come back from the store
+        if self.loaded and not (
+                self.messages and self.stored_before(self.messages[0].time)):
             return
 
         filledpoint = self.messages[0].time if self.messages else time.time()
@@ -314,6 +330,18 @@ class Roost(messages.SnipeBackend):
                 '%s < %s', util.timestr(filledpoint), util.timestr(target))
             return
 
+        if (self.messages and filledpoint - target > self.backfill_length
+                and not self.backfilling
+                and (self.store is None or self.store.earliest() is None
+                     or self.store.earliest() > target)):
+            # too far to page back to; go straight there and leave a gap
+            self.log.debug('jumping to %s', util.timestr(target))
+            self.reap_tasks()
+            self.tasks.append(
+                self.supervisor.start(self.error_message(
+                    'jumping', self.do_jump, target)))
+            return
+
         target = max(target, filledpoint - self.backfill_length)
 
         self.log.debug('triggering backfill, target=%s', util.timestr(target))
@@ -360,33 +388,21 @@ class Roost(messages.SnipeBackend):
                     def mfilter(m):
                         return True
 
-                if self.loaded:
-                    self.log.debug('no more messages to backfill')
-                    return
                 self.log.debug('backfilling')
-                chunk = await self.r.messages(start, self.chunksize)
-
-                if chunk['isDone']:
-                    self.log.info('IT IS DONE.')
-                    self.loaded = True
                 ms = []
-                for m in chunk['messages']:
-                    cm = await self.construct_and_maybe_decrypt(m)
-                    ms.append(cm)
+                if self.messages:
+                    ms = await self.store_before(
+                        self.messages[0].time, self.chunksize)
+                if ms:
+                    self.log.debug('%d messages from the store', len(ms))
+                elif self.loaded:
+                    self.log.debug('no more messages to backfill')
+                    return
+                else:
+                    ms = await self.fetch_backfill(start)
                 count += len([m for m in ms if mfilter(m)])
-                # Make sure ordering is stable
-                # XXX really assuming messages are millisecond unique si dumb
-                anchor = []
-                if self.messages and ms:
-                    anchor = [(self.messages[0], ms[0])]
-                for (nextmsg, prevmsg) in itertools.chain(
-                        anchor, zip(ms, ms[1:])):
-                    # walking backwards through time
-                    if nextmsg.time == prevmsg.time:
-                        prevmsg.time = nextmsg.time - .00001
-                ms.reverse()
-                self.messages = ms + self.messages
-                self.drop_cache()
+                self.messages.prepend(ms)
+                self.cache_added(ms)
                 self.log.debug(
                     '%d messages, total %d, earliest %s',
                     count,
@@ -406,6 +422,123 @@ class Roost(messages.SnipeBackend):
             finally:
                 self.state_set(messages.BackendState.IDLE)
 
+    async def do_jump(self, target):
+        """Fetch a chunk of messages from around ``target``, which is well
+        before anything loaded, leaving a gap between them and the rest."""
+
+        if self.backfilling:
+            return
+        self.backfilling = True
+        self.state_set(messages.BackendState.BACKFILLING)
+        try:
+            found = await self.r.bytime(int(target * 1000))
+            msgid = found.get('id') if found else None
+            if msgid is None:
+                self.log.debug('nothing at %s', util.timestr(target))
+                return
+            after = await self.r.messages(
+                msgid, self.chunksize // 2, reverse=False, inclusive=True)
+            before = await self.r.messages(msgid, self.chunksize // 2)
+
+            ms = []
+            for m in itertools.chain(
+                    reversed(after['messages']), before['messages']):
+                ms.append(await self.construct_and_maybe_decrypt(m))
+            self.destutter(ms)
+            ms.reverse()
+
+            first = self.messages[0] if self.messages else None
+            fetched = len(ms)
+            if first is not None:
+                ms = [m for m in ms if m < first]
+            if not ms:
+                return
+            self.loaded = before['isDone']
+            self.store_add(ms)
+            if self.store is not None:
+                self.store.island(ms[0].time, ms[-1].time)
+                if len(ms) < fetched:
+                    self.store.gap_fill(first.time, ms[-1].time)
+            if first is not None and len(ms) == fetched:
+                self.gap_add(ms[-1].time, first.time)
+            self.messages.prepend(ms)
+            self.cache_added(ms)
+            self.redisplay(ms[0], ms[-1])
+        finally:
+            self.backfilling = False
+            self.state_set(messages.BackendState.IDLE)
+
+    def fill_gap(self, gap):
+        if not self.connected or gap in self.filling:
+            return
+        self.filling.add(gap)
+        self.reap_tasks()
+        self.tasks.append(
+            self.supervisor.start(self.error_message(
+                'filling in', self.do_fill_gap, gap)))
+
+    async def do_fill_gap(self, gap):
+        """Fill in (the newest end of) a gap left by ``do_jump``."""
+
+        older, newer = gap
+        try:
+            edge = self.messages[self.messages.bisect_left(newer)]
+            ms = await self.store_before(newer, self.chunksize)
+            if not ms:
+                ms = await self.fetch_backfill(edge.data.get('id'), edge)
+            self.gap_remove(gap)
+            fresh = [m for m in ms if m.time > older]
+            if fresh and len(fresh) == len(ms):
+                self.gap_add(older, fresh[0].time)
+            self.log.debug(
+                'filled %d messages in before %s',
+                len(fresh), util.timestr(newer))
+            if fresh:
+                self.messages.merge(fresh)
+                self.cache_added(fresh)
+                self.redisplay(fresh[0], fresh[-1])
+        finally:
+            self.filling.discard(gap)
+
+    @staticmethod
+    def destutter(ms, anchor=None):
+        """Nudge the times of the (newest first) messages in ``ms`` so that
+        none are the same as the one after it, or as ``anchor``."""
+
+        # Make sure ordering is stable
+        # XXX really assuming messages are millisecond unique si dumb
+        pairs = zip(ms, ms[1:])
+        if anchor is not None and ms:
+            pairs = itertools.chain([(anchor, ms[0])], pairs)
+        for (nextmsg, prevmsg) in pairs:
+            # walking backwards through time
+            if nextmsg.time == prevmsg.time:
+                prevmsg.time = nextmsg.time - .00001
+
+    async def fetch_backfill(self, start, newer=None):
+        """Fetch a chunk of messages from before ``start`` (which is
+        ``newer``, or the first message) from the server, oldest first."""
+
+        chunk = await self.r.messages(start, self.chunksize)
+
+        if newer is None:
+            if chunk['isDone']:
+                self.log.info('IT IS DONE.')
+                self.loaded = True
+            if self.messages:
+                newer = self.messages[0]
+        ms = []
+        for m in chunk['messages']:
+            cm = await self.construct_and_maybe_decrypt(m)
+            ms.append(cm)
+        self.destutter(ms, newer)
+        ms.reverse()
+        self.store_add(ms)
+        if self.store is not None and newer is not None:
+            self.store.gap_fill(
+                newer.time, ms[0].time if ms else float('-inf'))
+        return ms
+
     @keymap.bind('R S')
     async def dump_subscriptions(self, window: interactive.window):
         subs = await self.r.subscriptions()
@@ -510,15 +643,24 @@ class Roost(messages.SnipeBackend):
 
 
 class RoostMessage(messages.SnipeMessage):
+    __slots__ = ()
+    # fields that take the same few values over and over
+    INTERN = (
+        'sender', 'class', 'instance', 'recipient', 'opcode', 'signature',
+        'auth', 'realm',
+        )
+
     def __init__(self, backend, m):
         super().__init__(backend, m['message'], m['receiveTime'] / 1000)
-        self.data = m
-        self._sender = RoostPrincipal(backend, m['sender'])
+        self.data = util.intern_values(m, self.INTERN)
 
         self.personal = (
             self.data['recipient'] and self.data['recipient'][0] != '@')
         self.outgoing = self.data['sender'] == self.backend.r.principal
 
+    def make_sender(self):
+        return RoostPrincipal(self.backend, self.data['sender'])
+
     def __str__(self):
         return (
             'Class: {class_} Instance: {instance} Recipient: {recipient}'
@@ -546,6 +688,24 @@ class RoostMessage(messages.SnipeMessage):
     def _normalize(value):
         return unicodedata.normalize('NFKC', value).lower()
 
+    # lots of messages share a class or instance, so remember what they
+    # come out as
+    @staticmethod
+    @functools.lru_cache(4096)
+    def _canon_class(value):
+        value = RoostMessage._normalize(value)
+        x1, x2 = RoostMessage.class_un.search(value).span()
+        value = value[x2:]
+        x1, x2 = RoostMessage.class_dotd.search(value).span()
+        return value[:x1]
+
+    @staticmethod
+    @functools.lru_cache(4096)
+    def _canon_instance(value):
+        value = RoostMessage._normalize(value)
+        x1, x2 = RoostMessage.class_dotd.search(value).span()
+        return value[:x1]
+
     def canon(self, field, value):
         if field == 'sender' or field == 'recipient':
             value = str(value)
@@ -553,15 +713,9 @@ class RoostMessage(messages.SnipeMessage):
             if value[-atrealmlen:] == '@' + self.backend.realm:
                 return value[:-atrealmlen]
         elif field == 'class':
-            value = self._normalize(value)
-            x1, x2 = self.class_un.search(value).span()
-            value = value[x2:]
-            x1, x2 = self.class_dotd.search(value).span()
-            value = value[:x1]
+            value = self._canon_class(value)
         elif field == 'instance':
-            value = self._normalize(value)
-            x1, x2 = self.class_dotd.search(value).span()
-            value = value[:x1]
+            value = self._canon_instance(value)
         elif field == 'opcode':
             value = value.lower().strip()
         return value
@@ -609,7 +763,7 @@ class RoostMessage(messages.SnipeMessage):
     def filter(self, specificity=0):
         nfilter = filters.Compare('==', 'backend', self.backend.name)
         if self.personal:
-            if str(self._sender) == self.backend.principal:
+            if str(self.sender) == self.backend.principal:
                 sender = self.backend.name + '; ' + self.field('recipient')
                 recipient = self.field('recipient')
             else:
@@ -730,6 +884,8 @@ class RoostPrincipal(messages.SnipeAddress):
 
 
 class RoostRegistrationMessage(messages.SnipeMessage):
+    __slots__ = ('future',)
+
     def __init__(self, backend, text, future):
         super().__init__(backend, text)
         self.future = future
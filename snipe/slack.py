@@ -34,6 +34,7 @@ Backend for talking to `Slack <https://slack.com>`.
 '''
 
 
+import sys
 import time
 import re
 import pprint
@@ -49,6 +50,7 @@ from . import imbroglio
 from . import interactive
 from . import keymap
 from . import messages
+from . import sortedlist
 from . import text
 from . import util
 
@@ -137,7 +139,7 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
         self.dests = {}
         self.users = {}
         self.connected = False
-        self.messages = []
+        self.messages = sortedlist.SortedList()
         self.nextid = itertools.count().__next__
         self.used_emoji = []
         self.websocket = None
@@ -257,10 +259,15 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
             if x.type in ('user', 'bot'))
 
     async def incoming(self, m):
+        count = len(self.messages)
         msg = await self.process_message(self.messages, m)
         if msg is not None:
-            self.drop_cache()
-            self.redisplay(msg, msg)
+            if len(self.messages) > count:
+                self.ingest([msg], added=True)
+            else:  # an edit, which might change what filters match
+                msg.changed()
+                self.drop_cache()
+                self.redisplay(msg, msg)
 
     def find_message(self, when, m):
         try:
@@ -305,6 +312,7 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
             data['_new'] = m
             msg.data['channel'] = m.get('channel')
             msg.data = data
+            msg.body = None  # work it out again from the new text
             return msg
         elif t in ('reaction_removed', 'reaction_added'):
             msg = self.find_message(float(m['item']['ts']), m)
@@ -335,6 +343,7 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
             u = m['user']
             self.users[u['id']] = u
             self.dests[u['id']] = SlackDest(self, 'user', u)
+            self.display_generation += 1
             return
         elif t == 'channel_created':
             c = m['channel']
@@ -343,6 +352,7 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
         elif t in ('channel_rename', 'group_rename'):
             c = m['channel']
             self.dests[c['id']].update(c)
+            self.display_generation += 1
             return
         elif t == 'group_joined':
             c = m['channel']
@@ -361,6 +371,7 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
     async def emoji_update(self):
         self.log.debug('attempting to retrieve emoji')
         self.emoji = await self.method('emoji.list')
+        self.display_generation += 1
 
     @keymap.bind('S U')
     def dump_users(self, window: interactive.window):
@@ -454,7 +465,7 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
                     self.log.exception('processing message: %s', repr(m))
                     raise
             self.log.debug('%s: got %d messages', dest, len(messagelist))
-            self.messages = list(messages.merge([self.messages, messagelist]))
+            self.messages.merge(messagelist)
             self.drop_cache()
             if messagelist:
                 self.redisplay(messagelist[0], messagelist[-1])
@@ -519,11 +530,12 @@ class Slack(messages.SnipeBackend, util.HTTP_JSONmixin):
             self.check(response, context, *args)
         except util.SnipeException as error:
             self.log.error(f'%s', '{error}: {response}')
-            self.messages.append(messages.SnipeErrorMessage(
+            msg = messages.SnipeErrorMessage(
                 self,
                 str(error) + '\n' + repr(response),
-                ))
-            self.drop_cache()
+                )
+            self.messages.append(msg)
+            self.cache_added([msg])
             return False
         return True
 
@@ -587,7 +599,10 @@ class SlackAddress(messages.SnipeAddress):
 
 
 class SlackMessage(messages.SnipeMessage):
+    __slots__ = ('channel', 'unhandled')
     SLACKMARKUP = re.compile(r'<(.*?)>')
+    # fields that take the same few values over and over
+    INTERN = ('type', 'subtype', 'user', 'bot_id', 'channel', 'team')
 
     def __init__(self, backend, m):
         backend.log.debug('message: %s', repr(m))
@@ -595,56 +610,70 @@ class SlackMessage(messages.SnipeMessage):
 
         super().__init__(
             backend,
-            t + ' ' + repr(m),
+            None,
             float(m.get('ts', time.time())))
 
-        self.data = m
-
-        if 'user' in m:
-            if isinstance(m['user'], dict):
-                self._sender = SlackAddress(backend, m['user']['id'])
-            else:
-                self._sender = SlackAddress(backend, m['user'])
-        elif 'bot_id' in m:
-            self._sender = SlackAddress(backend, m['bot_id'])
-        elif 'channel' in m:
-            self._sender = SlackAddress(backend, m['channel'])
+        self.data = util.intern_values(m, self.INTERN)
 
         self.channel = None
 
+        if t == 'message':
+            ch = m['channel']
+            self.channel = sys.intern(self.displayname(ch))
+            if (ch in self.backend.dests
+                    and self.backend.dests[ch].type == 'im'):
+                self.personal = True
+        elif t == 'presence_change':
+            # the body is made on demand, so refuse unknown users up front
+            if m['user'] not in self.backend.users:
+                raise KeyError(m['user'])
+            self.noise = True
+
+        self.unhandled = False
+        if ((t == 'message' and 'text' not in self.data)
+                or t not in ('message', 'presence_change',)):
+            self.unhandled = True
+            self.noise = True
+
+    def make_body(self):
+        m = self.data
+        t = m.get('type')
         if t == 'message':
             tx = m.get('text', '')
             if tx is None:
                 tx = ''
             bodylist = self.SLACKMARKUP.split(tx)
-            self.body = ''
+            body = ''
             for (n, s) in enumerate(bodylist):
                 if n % 2 == 0:
-                    self.body += s
+                    body += s
                 else:
                     if '|' in s:
-                        self.body += s.split('|', 1)[-1]
+                        body += s.split('|', 1)[-1]
                     else:
                         if s[:2] in ('#C', '@U'):
-                            self.body += self.displayname(s[1:])
+                            body += self.displayname(s[1:])
                         else:
-                            self.body += s
-
-            ch = m['channel']
-            self.channel = self.displayname(ch)
-            if (ch in self.backend.dests
-                    and self.backend.dests[ch].type == 'im'):
-                self.personal = True
+                            body += s
+            return body
         elif t == 'presence_change':
-            self.body = (
-                backend.users[m['user']]['name'] + ' is ' + m['presence'])
-            self.noise = True
+            return (
+                self.backend.users[m['user']]['name'] + ' is '
+                + m['presence'])
+        return t + ' ' + repr(m)
 
-        self.unhandled = False
-        if ((t == 'message' and 'text' not in self.data)
-                or t not in ('message', 'presence_change',)):
-            self.unhandled = True
-            self.noise = True
+    def make_sender(self):
+        m = self.data
+        if 'user' in m:
+            if isinstance(m['user'], dict):
+                return SlackAddress(self.backend, m['user']['id'])
+            else:
+                return SlackAddress(self.backend, m['user'])
+        elif 'bot_id' in m:
+            return SlackAddress(self.backend, m['bot_id'])
+        elif 'channel' in m:
+            return SlackAddress(self.backend, m['channel'])
+        return super().make_sender()
 
     def displayname(self, s):
         return str(self.backend.dests.get(s, s))
@@ -0,0 +1,260 @@
+# -*- encoding: utf-8 -*-
+# Copyright © 2017 the Snipe contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following
+# disclaimer in the documentation and/or other materials provided
+# with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+# TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+# THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+'''
+snipe.sortedlist
+----------------
+
+A sorted sequence stored as a list of bounded blocks, so that inserting
+into (or prepending to) a long message history doesn't copy all of it.
+'''
+
+
+import bisect
+import itertools
+
+
+class SortedList:
+    """A list that keeps itself sorted.
+
+    Items are kept in blocks of at most ``2 * load`` items.  Each block's
+    last item is kept in ``_maxes`` so that the block an item belongs in can
+    be found by bisection, and the position of the first item of each block
+    is kept (and lazily recomputed) in ``_offsets`` for positional lookup.
+
+    It supports enough of the ``list`` interface (``len``, indexing,
+    iteration, ``append``, ``index``) that code written for a sorted list of
+    messages keeps working.
+    """
+
+    LOAD = 512
+
+    def __init__(self, iterable=(), load=None):
+        self.load = load or self.LOAD
+        self._blocks = []
+        self._maxes = []
+        self._offsets = []
+        self._len = 0
+        items = sorted(iterable)
+        if items:
+            self.prepend(items)
+
+    def __repr__(self):
+        return '<%s %d items in %d blocks>' % (
+            self.__class__.__name__, self._len, len(self._blocks))
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._blocks)
+
+    def __reversed__(self):
+        for block in reversed(self._blocks):
+            yield from reversed(block)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(
+                a == b for (a, b) in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def _index(self):
+        if self._offsets is None:
+            self._offsets = list(itertools.accumulate(
+                itertools.chain([0], (len(b) for b in self._blocks[:-1]))))
+        return self._offsets
+
+    def _locate(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('SortedList index out of range')
+        last = len(self._blocks) - 1
+        if i >= self._len - len(self._blocks[last]):
+            # the common case, looking at recent messages
+            return last, i - (self._len - len(self._blocks[last]))
+        offsets = self._index()
+        b = bisect.bisect_right(offsets, i) - 1
+        return b, i - offsets[b]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._len)
+            if step != 1:
+                return list(self)[i]
+            if start >= stop:
+                return []
+            b, j = self._locate(start)
+            return list(itertools.islice(
+                itertools.chain(
+                    self._blocks[b][j:],
+                    itertools.chain.from_iterable(self._blocks[b + 1:])),
+                stop - start))
+        b, j = self._locate(i)
+        return self._blocks[b][j]
+
+    def _position(self, b, j):
+        return self._index()[b] + j
+
+    def bisect_left(self, x):
+        """Return the position ``x`` would be inserted before any equal
+        items."""
+        b = bisect.bisect_left(self._maxes, x)
+        if b == len(self._blocks):
+            return self._len
+        return self._position(b, bisect.bisect_left(self._blocks[b], x))
+
+    def bisect_right(self, x):
+        """Return the position ``x`` would be inserted after any equal
+        items."""
+        b = bisect.bisect_right(self._maxes, x)
+        if b == len(self._blocks):
+            return self._len
+        return self._position(b, bisect.bisect_right(self._blocks[b], x))
+
+    def index(self, x, lo=0, hi=None):
+        """Return the position of the first item in ``[lo, hi)`` equal to
+        ``x``, like ``list.index``."""
+
+        if hi is None or hi > self._len:
+            hi = self._len
+        i = max(lo, self.bisect_left(x))
+        while i < hi:
+            item = self[i]
+            if item == x:
+                return i
+            if x < item:
+                break
+            i += 1
+        raise ValueError('%s is not in SortedList' % (repr(x),))
+
+    def _split(self, b):
+        block = self._blocks[b]
+        if len(block) <= 2 * self.load:
+            return
+        self._blocks[b:b + 1] = [block[:self.load], block[self.load:]]
+        self._maxes[b:b + 1] = [block[self.load - 1], block[-1]]
+        self._offsets = None
+
+    def add(self, x):
+        """Insert ``x`` after any items equal to it."""
+
+        if not self._blocks:
+            self._blocks.append([x])
+            self._maxes.append(x)
+            self._offsets = [0]
+            self._len = 1
+            return
+
+        b = bisect.bisect_right(self._maxes, x)
+        last = len(self._blocks) - 1
+        if b > last:
+            b = last
+            self._blocks[b].append(x)
+        else:
+            bisect.insort_right(self._blocks[b], x)
+            if b != last:
+                self._offsets = None
+        self._maxes[b] = self._blocks[b][-1]
+        self._len += 1
+        self._split(b)
+
+    # for code that thinks it has a list; since the items are sorted,
+    # appending something that sorts earlier than the end will insert it in
+    # place
+    append = add
+
+    def extend(self, iterable):
+        for x in iterable:
+            self.add(x)
+
+    def prepend(self, items):
+        """Add a sorted sequence of items that sort before everything already
+        present, in bulk."""
+
+        items = list(items)
+        if not items:
+            return
+        if self._blocks and self._blocks[0][0] < items[-1]:
+            self.extend(items)
+            return
+        blocks = [
+            items[i:i + self.load] for i in range(0, len(items), self.load)]
+        self._blocks[0:0] = blocks
+        self._maxes[0:0] = [block[-1] for block in blocks]
+        self._len += len(items)
+        self._offsets = None
+
+    def drop_head(self, count):
+        """Remove the first ``count`` items, in bulk."""
+
+        count = min(count, self._len)
+        if count <= 0:
+            return
+        b, rest = 0, count
+        while rest >= len(self._blocks[b]):
+            rest -= len(self._blocks[b])
+            b += 1
+            if b == len(self._blocks):
+                break
+        del self._blocks[:b]
+        del self._maxes[:b]
+        if rest:
+            self._blocks[0] = self._blocks[0][rest:]
+        self._len -= count
+        self._offsets = None
+
+    def merge(self, items):
+        """Insert items, skipping those equal to something already present
+        (like ``messages.merge``), and return the number added."""
+
+        added = 0
+        for x in sorted(items):
+            i = self.bisect_left(x)
+            if i < self._len and self[i] == x:
+                continue
+            self.add(x)
+            added += 1
+        return added
+
+
+def bisect_left(seq, x):
+    """Bisect a SortedList or a plain sorted sequence."""
+    if isinstance(seq, SortedList):
+        return seq.bisect_left(x)
+    return bisect.bisect_left(seq, x)
+
+
+def bisect_right(seq, x):
+    """Bisect a SortedList or a plain sorted sequence."""
+    if isinstance(seq, SortedList):
+        return seq.bisect_right(x)
+    return bisect.bisect_right(seq, x)
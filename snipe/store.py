@@ -0,0 +1,265 @@
+# -*- encoding: utf-8 -*-
+# Copyright © 2017 the Snipe contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following
+# disclaimer in the documentation and/or other materials provided
+# with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+# TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+# THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+'''
+snipe.store
+-----------
+
+Append-only local storage for backend messages.
+
+Each backend gets a directory holding a segment file, one JSON record per
+line, and an index file of ``time offset key`` lines.  The index is small
+enough to read in its entirety at startup; the segment is only read as
+messages are asked for.
+
+What's stored needn't be contiguous: a gaps file lists pairs of stored
+message times between which messages may be missing, and ``before`` won't
+read across one.
+'''
+
+
+import bisect
+import json
+import logging
+import os
+
+from . import util
+
+
+class MessageStore:
+    SEGMENT = 'segment'
+    INDEX = 'index'
+    GAPS = 'gaps'
+
+    def __init__(self, path):
+        self.path = path
+        self.log = logging.getLogger('MessageStore.%x' % (id(self),))
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        self.times = []
+        self.offsets = []
+        self.keys = {}
+        self.gaps = []
+        self._reader = None
+        self._segment = None
+        self._index = None
+        self.load()
+
+    def __repr__(self):
+        return '<%s %s %d messages>' % (
+            self.__class__.__name__, self.path, len(self))
+
+    def __len__(self):
+        return len(self.times)
+
+    @staticmethod
+    def _opener(path, flags):
+        return os.open(path, flags, mode=0o600)
+
+    def load(self):
+        segment = os.path.join(self.path, self.SEGMENT)
+        index = os.path.join(self.path, self.INDEX)
+        try:
+            size = os.stat(segment).st_size
+        except FileNotFoundError:
+            size = 0
+
+        entries = []
+        if size and os.path.exists(index):
+            with open(index) as fp:
+                for line in fp:
+                    try:
+                        mtime, offset, key = line.rstrip('\n').split(' ', 2)
+                        entry = (float(mtime), int(offset), json.loads(key))
+                    except ValueError:
+                        # most likely a torn write at the end of the file
+                        self.log.warning(
+                            '%s: bad index line %s', self.path, repr(line))
+                        continue
+                    if entry[1] >= size:
+                        continue
+                    entries.append(entry)
+        entries.sort()
+
+        self.times = [mtime for (mtime, offset, key) in entries]
+        self.offsets = [offset for (mtime, offset, key) in entries]
+        self.keys = {key: mtime for (mtime, offset, key) in entries}
+
+        self.gaps = []
+        try:
+            with open(os.path.join(self.path, self.GAPS)) as fp:
+                self.gaps = sorted(
+                    [float(older), float(newer)]
+                    for (older, newer) in json.load(fp))
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError):
+            self.log.warning('%s: bad gaps file', self.path)
+
+        self._segment = open(segment, 'ab', opener=self._opener)
+        self._index = open(index, 'a', opener=self._opener)
+        self._reader = open(segment, 'rb')
+
+    def close(self):
+        for fp in (self._segment, self._index, self._reader):
+            if fp is not None:
+                fp.close()
+        self._segment = self._index = self._reader = None
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, mtime, key, data):
+        """Store a message's data, returning False if ``key`` is already
+        present."""
+
+        return bool(self.add_many([(mtime, key, data)]))
+
+    def add_many(self, records):
+        """Store the ``(time, key, data)`` triples in ``records``, skipping
+        ones whose key is ``None`` or already present, with one write to
+        each file; return how many were stored."""
+
+        offset = self._segment.tell()
+        segment, index, entries = [], [], []
+        for (mtime, key, data) in records:
+            if key is None or key in self.keys:
+                continue
+            record = json.dumps(
+                [mtime, key, data], separators=(',', ':')).encode() + b'\n'
+            segment.append(record)
+            index.append('%r %d %s\n' % (mtime, offset, json.dumps(key)))
+            entries.append((mtime, offset))
+            self.keys[key] = mtime
+            offset += len(record)
+        if not entries:
+            return 0
+
+        self._segment.write(b''.join(segment))
+        self._segment.flush()
+        self._index.write(''.join(index))
+        self._index.flush()
+
+        # later offsets break ties, so equal times stay in the order added
+        entries.sort()
+        if not self.times or entries[0][0] >= self.times[-1]:
+            self.times.extend(mtime for (mtime, offset) in entries)
+            self.offsets.extend(offset for (mtime, offset) in entries)
+        elif entries[-1][0] < self.times[0]:
+            self.times[0:0] = [mtime for (mtime, offset) in entries]
+            self.offsets[0:0] = [offset for (mtime, offset) in entries]
+        else:
+            merged = sorted(list(zip(self.times, self.offsets)) + entries)
+            self.times = [mtime for (mtime, offset) in merged]
+            self.offsets = [offset for (mtime, offset) in merged]
+        return len(entries)
+
+    def _read(self, i):
+        self._reader.seek(self.offsets[i])
+        mtime, key, data = json.loads(self._reader.readline())
+        return mtime, data
+
+    def earliest(self):
+        """Return the time of the oldest stored message, or None."""
+        return self.times[0] if self.times else None
+
+    def latest(self):
+        """Return the time of the newest stored message, or None."""
+        return self.times[-1] if self.times else None
+
+    def count_before(self, mtime):
+        """Return the number of stored messages from strictly before
+        ``mtime``."""
+        return bisect.bisect_left(self.times, mtime)
+
+    def before(self, mtime, count):
+        """Return up to ``count`` ``(time, data)`` pairs from strictly before
+        ``mtime``, oldest first, stopping at a gap."""
+
+        end = bisect.bisect_left(self.times, mtime)
+        start = max(0, end - count)
+        for (older, newer) in reversed(self.gaps):
+            if older >= mtime:
+                continue
+            if newer >= mtime:
+                # mtime is in the gap, and what's before it isn't known
+                return []
+            start = max(start, bisect.bisect_left(self.times, newer))
+            break
+        return [self._read(i) for i in range(start, end)]
+
+    def _write_gaps(self):
+        with util.safe_write(os.path.join(self.path, self.GAPS)) as fp:
+            json.dump(self.gaps, fp)
+
+    def gap_add(self, older, newer):
+        """Note that messages from between the stored ones at ``older`` and
+        ``newer`` may be missing."""
+
+        if [older, newer] in self.gaps:
+            return
+        bisect.insort(self.gaps, [older, newer])
+        self._write_gaps()
+
+    def island(self, lo, hi):
+        """Note that the stored messages from ``lo`` to ``hi`` are contiguous
+        but may not be with anything stored around them."""
+
+        for (i, (older, newer)) in enumerate(self.gaps):
+            if older < lo and hi < newer:
+                self.gaps[i:i + 1] = [[older, lo], [hi, newer]]
+                self._write_gaps()
+                return
+        below = bisect.bisect_left(self.times, lo)
+        above = bisect.bisect_right(self.times, hi)
+        if below > 0:
+            self.gap_add(self.times[below - 1], lo)
+        if above < len(self.times):
+            self.gap_add(hi, self.times[above])
+
+    def gap_fill(self, newer, oldest):
+        """Note that everything from ``oldest`` up to ``newer`` is now stored,
+        shrinking (or closing) the gap that ended at ``newer``."""
+
+        for (i, gap) in enumerate(self.gaps):
+            if gap[1] == newer:
+                if oldest <= gap[0]:
+                    del self.gaps[i]
+                else:
+                    gap[1] = oldest
+                self._write_gaps()
+                return
+
+    def between(self, start, end):
+        """Return the ``(time, data)`` pairs with ``start <= time < end``,
+        oldest first."""
+
+        return [
+            self._read(i) for i in range(
+                bisect.bisect_left(self.times, start),
+                bisect.bisect_left(self.times, end))]
@@ -40,15 +40,15 @@ import collections
 import contextlib
 import curses
 import fcntl
-import functools
 import itertools
 import locale
 import logging
 import os
+import re
 import select
 import signal
 import termios
-import unicodedata
+import time
 
 
 from . import imbroglio
@@ -73,6 +73,49 @@ def makefunc(name: str):
     return _
 
 
+class LayoutCache:
+    """How chunklets of text break into screen lines, shared by all of a
+    frontend's renderers and bounded by the amount of text it holds.
+
+    Entries are keyed on the text itself (rendered messages hang on to
+    their text, so this is mostly a pointer comparison), the width and
+    remaining width it was laid out in, and whether it was
+    right-justified, which is the only tag that affects wrapping.
+    """
+
+    # roughly how many characters' worth of layouts to hold onto
+    SIZE = 1 << 20
+
+    def __init__(self, size=None):
+        self.size = self.SIZE if size is None else size
+        self.layouts = collections.OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, width, remaining, tags=()):
+        right = 'right' in tags
+        key = (text, width, remaining, right)
+        layout = self.layouts.get(key)
+        if layout is not None:
+            self.hits += 1
+            self.layouts.move_to_end(key)
+            return layout
+        self.misses += 1
+        layout = TTYRenderer.doline(
+            text, width, remaining, ('right',) if right else ())
+        self.layouts[key] = layout
+        self.used += len(text) + 1
+        while self.used > self.size and len(self.layouts) > 1:
+            (text, _, _, _), _ = self.layouts.popitem(last=False)
+            self.used -= len(text) + 1
+        return layout
+
+    def clear(self):
+        self.layouts.clear()
+        self.used = 0
+
+
 class TTYRenderer:
     def __init__(self, ui, y, h, window, hints=None, whence=None):
         self.log = logging.getLogger('TTYRender.%x' % (id(self),))
@@ -143,7 +186,6 @@ class TTYRenderer:
         self.w.noutrefresh()
 
     @staticmethod
-    @functools.lru_cache(1024)  # if you have more than 1K lines, you thrash
     @util.listify
     def doline(s, width, remaining, tags=()):
         '''string, window width, remaining width, tags ->
@@ -155,8 +197,8 @@ class TTYRenderer:
         out = ''
         line = 0
         col = 0 if remaining is None or remaining <= 0 else width - remaining
-        for c in s:
-            # XXX combining characters, etc.
+        for run in _doline_runs(s):
+            c = run[0]
             if c == '\n':
                 if not right:
                     yield out, -1 if col < width else 0
@@ -165,13 +207,37 @@ class TTYRenderer:
                 out = ''
                 col = 0
                 line += 1
-            elif c >= ' ' or c == '\t':
+            elif ' ' <= c <= '~':
+                # a run of plain ASCII, which can go out as many
+                # characters at a time as fit
+                while run:
+                    room = max(width - col, 0)
+                    out += run[:room]
+                    if len(run) <= room:
+                        col += len(run)
+                        break
+                    col += room
+                    if right and line == 0:
+                        yield '', -1
+                        col = remaining
+                    else:
+                        yield out, 0
+                        out = ''
+                        col = 0
+                    line += 1
+                    out += run[room]
+                    col += 1
+                    run = run[room + 1:]
+            elif c > ' ' or c == '\t':
+                # XXX combining characters, etc.
                 if c == '\t':
                     c = ' ' * (8 - col % 8)
-                l = util.glyphwidth(c)
-                if not l and unicodedata.category(c) not in ('Mn', 'Me'):
-                    # non printing characters... don't
-                    continue
+                    l = len(c)
+                else:
+                    l = util.charwidth(c)
+                    if l < 0:
+                        # non printing characters... don't
+                        continue
                 if col + l > width:
                     if right and line == 0:
                         yield '', -1
@@ -189,6 +255,13 @@ class TTYRenderer:
             yield out, width - col
 
     def compute_attr(self, tags):
+        tags = frozenset(tags)
+        attr = self.ui.attrs.get(tags)
+        if attr is None:
+            attr = self.ui.attrs[tags] = self._compute_attr(tags)
+        return attr
+
+    def _compute_attr(self, tags):
         # A_BLINK A_DIM A_INVIS A_NORMAL A_STANDOUT A_REVERSE A_UNDERLINE
         attrs = {
             'bold': curses.A_BOLD,
@@ -236,6 +309,7 @@ class TTYRenderer:
             chunkat = screenlines
 
             for tags, text in chunk:
+                tags = frozenset(tags)
                 attr = self.compute_attr(tags)
                 if 'cursor' in tags:
                     cursor = (y, x)
@@ -248,8 +322,8 @@ class TTYRenderer:
                 if 'right' in tags:
                     text = text.rstrip('\n')  # XXX chunksize
 
-                textbits = self.doline(
-                    text, self.width, remaining, frozenset(tags))
+                textbits = self.ui.layouts.get(
+                    text, self.width, remaining, tags)
                 if not textbits:
                     if remaining is None or remaining <= 0:
                         remaining = self.width
@@ -480,7 +554,7 @@ class TTYRenderer:
         remaining = None
 
         for tags, text in chunk:
-            for line, remaining in self.doline(
+            for line, remaining in self.ui.layouts.get(
                     text, self.width, remaining, frozenset(tags)):
                 if 'right' in tags:
                     remaining = 0
@@ -504,6 +578,10 @@ class TTYRenderer:
 del makefunc
 
 
+# runs of printable ASCII, or single other characters
+_doline_runs = re.compile(r'[ -~]+|.', re.DOTALL).findall
+
+
 unkey = dict(
     (getattr(curses, k), k[len('KEY_'):])
     for k in dir(curses)
@@ -525,10 +603,16 @@ Whence = collections.namedtuple(
 
 class TTYFrontend:
     INTCHAR = 7  # Control-G # XXX
+    # repaint at most this often (in seconds), except right after input
+    FRAME_INTERVAL = 1 / 30
 
     def __init__(self):
         self.stdscr, self.maxy, self.maxx, self.input, self.output = (None,)*5
         self.windows = []
+        self.layouts = LayoutCache()
+        # curses attributes for each set of tags seen since the colors
+        # were last reset
+        self.attrs = {}
         self.notify_silent = True
         self.log = logging.getLogger('%s.%x' % (
             self.__class__.__name__,
@@ -538,9 +622,19 @@ class TTYFrontend:
         self.in_redisplay = False
         self.running = False
         self.quit = False
+        self.supervisor = None
+        # hints that have come in since the last frame (None means
+        # everything) and the task that will paint them
+        self.pending_hints = []
+        self.frame_task = None
+        self.frame_last = 0.0
+        self.frames = 0
+        self.frames_skipped = 0
+        self.render_time = 0.0
 
     async def __aenter__(self):
         locale.setlocale(locale.LC_ALL, '')
+        util.glyphwidth_reset()
         self.stdscr = curses.initscr()
         curses.noecho()
         curses.nonl()
@@ -631,6 +725,8 @@ class TTYFrontend:
 
     async def __aexit__(self, type, value, tb):
         self.running = False
+        if self.frame_task is not None:
+            self.frame_task.cancel()
         # go to last line of screen, maybe cause scrolling?
         self.color_assigner.close()
         self.stdscr.keypad(0)
@@ -754,11 +850,12 @@ class TTYFrontend:
                     self.readable_int(k)
                 except KeyboardInterrupt:
                     pass
+                # paint right away rather than waiting for the next frame
                 if state == (list(self.windows), self.input, self.output):
-                    self.redisplay(
+                    self.render(
                         self.windows[self.output].window.redisplay_hint())
-                else:
-                    self.redisplay()
+                else:  # the layout changed, so repaint everything
+                    self.render(None)
 
     def readable_int(self, k):
         self.windows[self.input].window.input_char(k)
@@ -769,14 +866,46 @@ class TTYFrontend:
         self.full_redisplay = True
 
     def redisplay(self, hint=None):
+        """Arrange for the windows ``hint`` applies to (or all of them) to be
+        repainted by the next frame."""
+
         if not self.running:
             raise util.SnipeException('redisplay call to inactive frontend')
 
+        self.pending_hints.append(hint)
+        if self.supervisor is None:
+            self.render()
+        elif self.frame_task is None:
+            self.frame_task = self.supervisor.start(self.frame())
+
+    async def frame(self):
+        try:
+            await imbroglio.sleep(max(
+                0, self.frame_last + self.FRAME_INTERVAL - time.monotonic()))
+        finally:
+            self.frame_task = None
+        if self.running:
+            self.render()
+
+    def render(self, hint=False):
+        """Paint everything that's pending (and ``hint``, if given) now."""
+
+        if not self.running:
+            raise util.SnipeException('redisplay call to inactive frontend')
+
+        hints, self.pending_hints = self.pending_hints, []
+        if hint is not False:
+            hints.append(hint)
+        if not hints:
+            return
+        requests = len(hints)
+
         self.log.debug('windows = %s:%d', repr(self.windows), self.output)
 
         if self.in_redisplay:  # pragma: nocover
             raise RedisplayInProgress
 
+        start = time.monotonic()
         while True:
             try:
                 self.in_redisplay = True
@@ -787,19 +916,22 @@ class TTYFrontend:
                     return
 
                 if self.full_redisplay:
-                    hint = None
+                    hints = [None]
                     self.full_redisplay = False
 
-                if hint is None:
+                if None in hints:
                     # only reset the color map if we're redrawing everything
                     self.color_assigner.reset()
+                    self.attrs.clear()
 
+                everything = not all(hints)
                 active = None
                 for i in range(len(self.windows) - 1, -1, -1):
                     w = self.windows[i]
                     if i == self.output:
                         active = w
-                    if not hint or w.check_redisplay_hint(hint):
+                    if everything or any(
+                            w.check_redisplay_hint(h) for h in hints):
                         self.log.debug('calling redisplay on 0x%x', id(w))
                         w.redisplay()
                 if active is not None:
@@ -811,6 +943,25 @@ class TTYFrontend:
             finally:
                 self.in_redisplay = False
 
+        self.frame_last = time.monotonic()
+        self.frames += 1
+        self.frames_skipped += requests - 1
+        self.render_time += self.frame_last - start
+
+    def stats(self):
+        """Return how many frames have been painted, how many redisplay
+        requests were folded into other frames, the total (and mean)
+        time spent painting, and how often line layouts were reused."""
+
+        return {
+            'frames': self.frames,
+            'skipped': self.frames_skipped,
+            'render_time': self.render_time,
+            'mean_render_time': self.render_time / max(1, self.frames),
+            'layout_hits': self.layouts.hits,
+            'layout_misses': self.layouts.misses,
+            }
+
     def notify(self):
         if self.notify_silent:
             curses.flash()
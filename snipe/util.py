@@ -35,6 +35,9 @@ Assorted utility functions.
 '''
 
 
+import array
+import codecs
+import collections
 import contextlib
 import ctypes
 import datetime
@@ -44,6 +47,7 @@ import functools
 import logging
 import math
 import os
+import re
 import socket
 import ssl
 import sys
@@ -70,6 +74,9 @@ class SnipeException(Exception):
 
 class Configurable:
     registry: Dict[str, 'Configurable'] = {}
+    # bumped whenever any setting changes, so that things computed from
+    # settings can tell when they're stale
+    generation = 0
 
     def __init__(
             self, key,
@@ -104,6 +111,7 @@ class Configurable:
             raise ValueError('%s invalid for %s' % (repr(v), self.key))
         instance.context.conf.setdefault('set', {})[self.key] = value
         self.override = None
+        Configurable.generation += 1
         self.action(instance.context, value)
 
     def set_override(self, v):
@@ -111,6 +119,7 @@ class Configurable:
         if not self.validate(value):
             raise ValueError('%s invalid for %s' % (repr(v), self.key))
         self.override = value
+        Configurable.generation += 1
 
     def action(self, instance, value):
         if self._action is not None:
@@ -133,6 +142,7 @@ class Configurable:
 
     @classmethod
     def immanentize(self, context):
+        Configurable.generation += 1
         for configurable in self.registry.values():
             configurable.action(context, configurable.__get__(context, self))
 
@@ -327,6 +337,118 @@ class JSONDecodeError(SnipeException):
         return str(self.data)
 
 
+# JSON texts longer than this get parsed with json_loads rather than
+# json.loads, down to this many levels of containers
+JSON_INCREMENTAL_THRESHOLD = 256 * 1024
+JSON_INCREMENTAL_DEPTH = 2
+
+# if nonzero, compressed HTTP payload chunks at least this big get
+# decompressed in a worker thread (zlib lets go of the GIL while it works),
+# and websocket messages at least this big are parsed with json_loads
+OFFLOAD_THRESHOLD = 0
+
+_json_decoder = json.JSONDecoder()
+_json_whitespace = re.compile(r'[ \t\n\r]*')
+_json_numeric = frozenset('0123456789+-.eE')
+
+
+async def json_loads(s, depth=JSON_INCREMENTAL_DEPTH, more=None):
+    """Like json.loads, but for big texts: walk the outer ``depth`` levels
+    of arrays and objects by hand, handing their elements to the regular
+    decoder one at a time and letting other tasks run in between.
+
+    If ``more`` is given, ``s`` is only the beginning of the text, and
+    awaiting ``more()`` returns the next piece of it (or None at the end);
+    the text that has been parsed is let go of as the rest comes in."""
+
+    done = more is None
+
+    async def fill(idx):
+        # get more text, dropping what's before idx; return the new idx
+        nonlocal s, done
+        piece = await more()
+        if piece is None:
+            done = True
+            return idx
+        s = s[idx:] + piece
+        return 0
+
+    async def avail(idx):
+        while idx >= len(s) and not done:
+            idx = await fill(idx)
+        return idx
+
+    async def skip(idx):
+        while True:
+            idx = _json_whitespace.match(s, idx).end()
+            if idx < len(s) or done:
+                return idx
+            idx = await fill(idx)
+
+    async def expect(idx, chars):
+        idx = await avail(idx)
+        c = s[idx:idx + 1]
+        if not c or c not in chars:
+            raise json.JSONDecodeError(
+                'Expecting ' + ' or '.join(repr(c) for c in chars), s, idx)
+        return c, idx + 1
+
+    async def decode(f, idx):
+        # f(s, idx) might run off the end of what's arrived so far, or stop
+        # short in the middle of a number, so only believe it if something
+        # that can't be more of a number follows; otherwise read at least
+        # as much again and retry
+        while True:
+            try:
+                v, end = f(s, idx)
+                if done or (end < len(s) and s[end] not in _json_numeric):
+                    return v, end
+            except json.JSONDecodeError:
+                if done:
+                    raise
+            want = 2 * (len(s) - idx) + 1
+            while len(s) - idx < want and not done:
+                idx = await fill(idx)
+
+    async def value(idx, depth):
+        idx = await skip(idx)
+        c = s[idx:idx + 1]
+        if depth and c == '[':
+            result = []
+            idx = await skip(idx + 1)
+            if s[idx:idx + 1] == ']':
+                return result, idx + 1
+            while True:
+                v, idx = await value(idx, depth - 1)
+                result.append(v)
+                c, idx = await expect(await skip(idx), ',]')
+                if c == ']':
+                    return result, idx
+                await imbroglio.switch()
+        elif depth and c == '{':
+            result = {}
+            idx = await skip(idx + 1)
+            if s[idx:idx + 1] == '}':
+                return result, idx + 1
+            while True:
+                c, idx = await expect(idx, '"')
+                key, idx = await decode(json.decoder.scanstring, idx)
+                c, idx = await expect(await skip(idx), ':')
+                result[key], idx = await value(idx, depth - 1)
+                c, idx = await expect(await skip(idx), ',}')
+                if c == '}':
+                    return result, idx
+                idx = await skip(idx)
+                await imbroglio.switch()
+        return await decode(_json_decoder.raw_decode, idx)
+
+    result, idx = await value(0, depth)
+    idx = await skip(idx)
+    if idx != len(s):
+        raise json.JSONDecodeError('Extra data', s, idx)
+    return result
+
+
 class HTTP_JSONmixin:
     # object must have a .log attribute
 
@@ -336,6 +458,8 @@ class HTTP_JSONmixin:
         self._JSONmixin_headers = [
             ('User-Agent', (USER_AGENT + f' (h11 {h11.__version__})'))]
         self._JSONmixin_headers.extend(headers.items())
+        if getattr(self, '_JSONmixin_pool', None) is None:
+            self._JSONmixin_pool = HTTPPool(log=self.log)
 
     async def reset_client_session_headers(self, headers=None):
         self.setup_client_session(headers)
@@ -343,19 +467,46 @@ class HTTP_JSONmixin:
     async def _request(self, *args, **kwargs):
         response = None
         try:
-            response = await HTTP.request(*args, **kwargs)
-            datas = []
-            while True:
-                b = await response.readsome()
-                if b is None:
-                    break
-                datas.append(b)
-            bs = b''.join(datas)
+            response = await HTTP.request(
+                *args, pool=self._JSONmixin_pool, **kwargs)
+            # decode the body a piece at a time as it arrives; if it's big,
+            # parse it as it comes in, so that the whole text never has to
+            # be in memory (let alone twice over, as bytes and str)
+            decoder = codecs.getincrementaldecoder('UTF-8')()
+            done = False
+
+            async def more():
+                nonlocal done
+                while not done:
+                    b = await response.readsome()
+                    if b is None:
+                        done = True
+                        piece = decoder.decode(b'', True)
+                    else:
+                        piece = decoder.decode(b)
+                    if piece:
+                        return piece
+                return None
+
             try:
-                u = bs.decode('UTF-8')
-                result = json.loads(u)
+                pieces, size = [], 0
+                while size < JSON_INCREMENTAL_THRESHOLD:
+                    piece = await more()
+                    if piece is None:
+                        break
+                    pieces.append(piece)
+                    size += len(piece)
+                text = ''.join(pieces)
+                del pieces
+                if done:
+                    result = json.loads(text)
+                else:
+                    result = await json_loads(text, more=more)
             except (UnicodeError, ValueError) as e:
-                data = bs.decode(errors='replace')
+                if isinstance(e, UnicodeDecodeError):
+                    data = e.object.decode(errors='replace')
+                else:
+                    data = getattr(e, 'doc', '')
                 self.log.error(
                     'json %s from %s on %s',
                     e.__class__.__name__, response.url, repr(data))
@@ -411,6 +562,8 @@ class HTTP_JSONmixin:
             )
 
     async def shutdown(self):
+        if getattr(self, '_JSONmixin_pool', None) is not None:
+            await self._JSONmixin_pool.close()
         await super().shutdown()
 
 
@@ -435,6 +588,9 @@ class JSONWebSocket:
     async def read(self):
         data = await self.conn.read()
         try:
+            if (OFFLOAD_THRESHOLD and isinstance(data, str)
+                    and len(data) >= OFFLOAD_THRESHOLD):
+                return await json_loads(data)
             return json.loads(data)
         except json.decoder.JSONDecodeError as e:
             raise JSONDecodeError(data) from e  # raise our own exception
@@ -525,9 +681,61 @@ def _setup_wcwidth():
 _wcwidth = _setup_wcwidth()
 
 
-@functools.lru_cache(None)
+def _width_page(page):
+    # the widths of the 256 characters starting at page << 8, with -1
+    # for characters that take up no space and don't combine with
+    # anything either, which the renderer drops
+    widths = array.array('b')
+    for i in range(page << 8, (page + 1) << 8):
+        c = chr(i)
+        width = _wcwidth(c)
+        if not width and unicodedata.category(c) not in ('Mn', 'Me'):
+            width = -1
+        widths.append(width)
+    return widths
+
+
+_width_pages: Dict[int, array.array] = {}
+
+
+def charwidth(c):
+    """Return how many cells the character c takes up on the screen, or
+    -1 if it's something that shouldn't be displayed at all."""
+
+    i = ord(c)
+    widths = _width_pages.get(i >> 8)
+    if widths is None:
+        widths = _width_pages[i >> 8] = _width_page(i >> 8)
+    return widths[i & 0xff]
+
+
+@functools.lru_cache(8192)
 def glyphwidth(s):
-    return sum(_wcwidth(c) for c in s)
+    if s.isascii():
+        if s.isprintable():
+            return len(s)
+        return sum(1 for c in s if ' ' <= c <= '~')
+    return sum(max(charwidth(c), 0) for c in s)
+
+
+def glyphwidth_reset():
+    """Forget all the widths that have been worked out, because they
+    depend on the locale and it's changed."""
+
+    _width_pages.clear()
+    glyphwidth.cache_clear()
+
+
+def intern_values(d, keys):
+    """Replace the string values of ``keys`` in the dictionary ``d`` with
+    interned copies, so that the thousands of messages from the same
+    sender or to the same channel share one string.  Returns ``d``."""
+
+    for key in keys:
+        value = d.get(key)
+        if value.__class__ is str:
+            d[key] = sys.intern(value)
+    return d
 
 
 def escapify(c):
@@ -560,6 +768,41 @@ def getobj(qualname):
     return getattr(module, name)
 
 
+class ReadBuffer:
+    """
+    A reusable buffer to read into, which doubles (up to MAX) after a read
+    fills it and halves (down to MIN) after a read that barely uses it.
+
+    Reads hand out memoryviews of the buffer, which are only good until
+    the next read.
+    """
+
+    MIN = 4096
+    MAX = 1024 * 1024
+
+    def __init__(self):
+        self.resize(self.MIN)
+
+    def resize(self, size):
+        # a new buffer rather than resizing the old one, which may still
+        # have views outstanding
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def done(self, count):
+        """Return the first count bytes and adjust the size for next time."""
+        data = self.view[:count]
+        size = len(self.buffer)
+        if count == size and size < self.MAX:
+            self.resize(size * 2)
+        elif count < size // 8 and size > self.MIN:
+            self.resize(size // 2)
+        return data
+
+
 class NetworkStream:
     def __init__(self, sock, hostname='', port=0, log=None):
         if log is None:
@@ -571,6 +814,7 @@ class NetworkStream:
         self.socket = sock
         self.socket.setblocking(False)
         self.reof = False
+        self.readbuffer = ReadBuffer()
 
         self.log.debug('%s', f'connected to {self.socket!r}')
 
@@ -584,20 +828,30 @@ class NetworkStream:
         return klass(sock, hostname, port, log)
 
     async def readsome(self):
+        """Return what's available to read (as a memoryview that is only
+        valid until the next call), b'' if nothing was, or None at EOF."""
         if self.reof:
             return None
         await imbroglio.readwait(self.socket.fileno())
-        try:
-            buf = self.socket.recv(4096)
-        except BlockingIOError:  # pragma: nocover
-            # shouldn't actually happen
-            return ''
-        if buf == b'':
-            self.log.debug('readsome: got eof')
-            self.reof = True
-            return None
-        self.log.debug('readsome: %d bytes, reof %s', len(buf), self.reof)
-        return buf
+
+        # drain whatever is there, up to the size of the buffer
+        buf = self.readbuffer
+        count = 0
+        while count < len(buf):
+            try:
+                n = self.socket.recv_into(buf.view[count:])
+            except BlockingIOError:
+                break
+            if n == 0:
+                self.log.debug('readsome: got eof')
+                self.reof = True
+                break
+            count += n
+
+        if not count:
+            return None if self.reof else b''
+        self.log.debug('readsome: %d bytes, reof %s', count, self.reof)
+        return buf.done(count)
 
     async def readable(self):
         if self.reof:
@@ -624,6 +878,13 @@ class NetworkStream:
 class SSLStream:
     # XXX needs refactored
 
+    # one context (and thus one load of the CA bundle) for everybody,
+    # and the most recent session for each host so we can resume it
+    _context = None
+    SESSIONS_MAX = 64
+    sessions: Dict[str, ssl.SSLSession] = collections.OrderedDict()
+    handshake_stats = {'handshakes': 0, 'resumed': 0, 'time': 0.0}
+
     def __init__(self, netstream, hostname, log=None):
         if log is None:
             self.log = logging.getLogger('SSLStream.%s' % (hostname,))
@@ -631,16 +892,43 @@ class SSLStream:
             self.log = log
         self.reof = False
 
+        self.hostname = hostname
         self.netstream = netstream
+        self.readbuffer = ReadBuffer()
         self.incoming = ssl.MemoryBIO()
         self.outgoing = ssl.MemoryBIO()
-        self.ctx = ssl.create_default_context()
+        self.ctx = self.context()
+        kw = {}
+        session = self.sessions.get(hostname)
+        if session is not None:
+            kw['session'] = session
         self.obj = self.ctx.wrap_bio(
             self.incoming, self.outgoing, server_side=False,
-            server_hostname=hostname)
+            server_hostname=hostname, **kw)
         self.handshake_done = False
         self.log.debug('%s', f'wrapped {self.netstream!r}')
 
+    @classmethod
+    def context(klass):
+        if SSLStream._context is None:
+            SSLStream._context = ssl.create_default_context()
+        return SSLStream._context
+
+    @classmethod
+    def reset(klass):
+        """Forget the shared context, and the sessions that belong to it, so
+        the next stream gets a new one."""
+        SSLStream._context = None
+        SSLStream.sessions.clear()
+
+    def save_session(self):
+        session = getattr(self.obj, 'session', None)
+        if session is not None:
+            self.sessions[self.hostname] = session
+            self.sessions.move_to_end(self.hostname)
+            while len(self.sessions) > self.SESSIONS_MAX:
+                self.sessions.popitem(last=False)
+
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.netstream!r}>'
 
@@ -649,6 +937,7 @@ class SSLStream:
             return
 
         self.log.debug('doing handshake')
+        t0 = time.monotonic()
 
         while True:
             try:
@@ -670,6 +959,16 @@ class SSLStream:
             await self.netstream.write(self.outgoing.read())
         self.handshake_done = True
 
+        duration = time.monotonic() - t0
+        resumed = bool(getattr(self.obj, 'session_reused', False))
+        self.handshake_stats['handshakes'] += 1
+        self.handshake_stats['resumed'] += resumed
+        self.handshake_stats['time'] += duration
+        self.log.debug(
+            'handshake took %.3fs%s',
+            duration, ' (resumed)' if resumed else '')
+        self.save_session()
+
     async def write(self, data):
         await self.do_handshake()
 
@@ -700,14 +999,17 @@ class SSLStream:
             await self.netstream.write(self.outgoing.read())
 
     async def readsome(self):
+        """Return what's available to read (as a memoryview that is only
+        valid until the next call) or None at EOF."""
         if self.reof:
             return None
         await self.readable()
 
+        buf = self.readbuffer
         while True:
             try:
-                data = self.obj.read()
-                if data == b'':
+                count = self.obj.read(len(buf), buf.buffer)
+                if count == 0:
                     self.reof = True
                     return None
             except ssl.SSLWantReadError:
@@ -726,8 +1028,23 @@ class SSLStream:
                 return None
             break
 
-        self.log.debug('got %d bytes from SSL', len(data))
-        return data
+        # and anything else that's already been decrypted, or can be
+        # without waiting for the network
+        while count < len(buf):
+            try:
+                n = self.obj.read(len(buf) - count, buf.view[count:])
+            except ssl.SSLWantReadError:
+                break
+            except ssl.SSLEOFError:
+                self.reof = True
+                break
+            if n == 0:
+                self.reof = True
+                break
+            count += n
+
+        self.log.debug('got %d bytes from SSL', count)
+        return buf.done(count)
 
     async def readable(self):
         if self.reof:
@@ -758,11 +1075,140 @@ class SSLStream:
 
     async def close(self):
         self.log.debug('%s', f'closing {self.netstream}')
+        if self.handshake_done:
+            # TLS 1.3 tickets show up after the handshake
+            self.save_session()
         await self.netstream.close()
 
 
+class HTTPPool:
+    """
+    Idle HTTP/1.1 connections, kept open for reuse, by (scheme, host, port).
+
+    At most ``max_per_host`` connections to a given host are leased out at
+    once (further requests wait their turn), and connections that have been
+    idle more than ``idle_timeout`` seconds, or that the server has closed
+    (or sent something unsolicited on) while idle, are closed rather than
+    reused.
+    """
+
+    MAX_PER_HOST = 4
+    IDLE_TIMEOUT = 30.0
+
+    def __init__(self, max_per_host=None, idle_timeout=None, log=None):
+        self.max_per_host = max_per_host or self.MAX_PER_HOST
+        self.idle_timeout = idle_timeout or self.IDLE_TIMEOUT
+        self.log = log if log is not None else logging.getLogger('HTTPPool')
+        self.idle = {}  # key -> [(stream, time released), ...]
+        self.active = collections.Counter()
+        self.waiters = {}  # key -> deque of Promises
+        self.opened = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(scheme, hostname, port):
+        return (scheme, hostname, port)
+
+    async def lease(self, scheme, hostname, port):
+        """Return a stream connected to the host, reused if possible."""
+        stream, reused = await self.checkout(scheme, hostname, port)
+        return stream
+
+    async def checkout(self, scheme, hostname, port, fresh=False):
+        """Return a stream connected to the host, reused if possible (and
+        not ``fresh``), and whether it was."""
+        key = self.key(scheme, hostname, port)
+        while True:
+            idle = self.idle.get(key)
+            while idle and not fresh:
+                stream, when = idle.pop()
+                if (time.monotonic() - when < self.idle_timeout
+                        and not await self._stale(stream)):
+                    self.active[key] += 1
+                    self.reused += 1
+                    self.log.debug('%s', f'reusing {stream!r}')
+                    return stream, True
+                await stream.close()
+            if self.active[key] < self.max_per_host:
+                break
+            promise = imbroglio.Promise()
+            waiters = self.waiters.setdefault(key, collections.deque())
+            waiters.append(promise)
+            try:
+                await promise
+            except BaseException:
+                # cancelled: don't leave a dead waiter behind, and if we'd
+                # been woken already, pass the turn on
+                if promise.done:
+                    self._wake(key)
+                else:
+                    waiters.remove(promise)
+                raise
+
+        self.active[key] += 1
+        try:
+            stream = await NetworkStream.connect(hostname, port)
+            if scheme == 'https':
+                stream = SSLStream(stream, hostname)
+        except BaseException:
+            self._done(key)
+            raise
+        self.opened += 1
+        return stream, False
+
+    async def release(self, scheme, hostname, port, stream, reusable):
+        """Hand back a leased stream, to be kept if ``reusable`` (i.e. the
+        exchange on it completed cleanly and the server didn't ask us to
+        close it)."""
+        key = self.key(scheme, hostname, port)
+        idle = self.idle.setdefault(key, [])
+        now = time.monotonic()
+        stale = [s for (s, when) in idle if now - when >= self.idle_timeout]
+        idle[:] = [(s, when) for (s, when) in idle if s not in stale]
+        if reusable and len(idle) < self.max_per_host:
+            idle.append((stream, now))
+        else:
+            stale.append(stream)
+        self._done(key)
+        for stream in stale:
+            await stream.close()
+
+    def _done(self, key):
+        self.active[key] -= 1
+        self._wake(key)
+
+    def _wake(self, key):
+        waiters = self.waiters.get(key)
+        if waiters:
+            waiters.popleft().set_result(None)
+
+    @staticmethod
+    async def _stale(stream):
+        # an idle connection shouldn't have anything to read; if it
+        # does, it's probably the server hanging up
+        return await getattr(stream, 'netstream', stream).readable()
+
+    async def close(self):
+        idle, self.idle = self.idle, {}
+        for streams in idle.values():
+            for stream, when in streams:
+                await stream.close()
+
+    def stats(self):
+        return {
+            'opened': self.opened,
+            'reused': self.reused,
+            'active': sum(self.active.values()),
+            'idle': sum(len(x) for x in self.idle.values()),
+            }
+
+
 class HTTP:
-    def __init__(self, url, method='GET', log=None):
+    # requests it's safe to send again if a reused connection turns out to
+    # have been closed under us
+    IDEMPOTENT = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'))
+
+    def __init__(self, url, method='GET', log=None, pool=None):
         if log is not None:
             self.log = log
         else:
@@ -780,25 +1226,66 @@ class HTTP:
         self.connected = False
         self.response = None
         self.decompressor = None
+        self.pool = pool
+        self.stream = None
+        self.reused = False
+        self.retried = False
+        self.sent = None
 
     @classmethod
     async def request(
             klass, url, method='GET', data=None, json=None, headers=[],
-            log=None):
-        obj = klass(url, method, log)
-        await obj.connect(data=data, _json=json, headers=headers)
+            log=None, pool=None):
+        obj = klass(url, method, log, pool)
+        try:
+            try:
+                await obj.connect(data=data, _json=json, headers=headers)
+            except OSError:
+                if not obj.retryable():
+                    raise
+                await obj.retry()
+        except BaseException:
+            if obj.stream is not None:
+                await obj.close()
+            raise
         return obj
 
-    async def connect(self, data=None, _json=None, headers=[]):
-        self.stream = await NetworkStream.connect(self.hostname, self.port)
-        if self.scheme == 'https':
-            self.stream = SSLStream(self.stream, self.hostname)
+    def retryable(self):
+        """Return whether the request could have failed just because the
+        server closed the reused connection it went out on, and so can be
+        sent again on a new one."""
+        return (
+            self.reused and not self.retried and self.response is None
+            and self.method in self.IDEMPOTENT)
 
-        outheaders = [
-            ('Host', self.hostname),
-            ('Connection', 'close'),
-            ('Accept-Encoding', 'gzip'),
-            ]
+    async def retry(self):
+        self.log.debug(
+            '%s', f'{self.url}: {self.stream!r} was closed, retrying')
+        self.retried = True
+        await self.close()
+        self.stream = None
+        self.conn = h11.Connection(our_role=h11.CLIENT)
+        self.connected = False
+        await self.connect(*self.sent, fresh=True)
+
+    async def connect(self, data=None, _json=None, headers=[], fresh=False):
+        self.sent = (data, _json, headers)
+        if self.pool is None:
+            self.stream = await NetworkStream.connect(self.hostname, self.port)
+            if self.scheme == 'https':
+                self.stream = SSLStream(self.stream, self.hostname)
+            outheaders = [
+                ('Host', self.hostname),
+                ('Connection', 'close'),
+                ('Accept-Encoding', 'gzip'),
+                ]
+        else:
+            self.stream, self.reused = await self.pool.checkout(
+                self.scheme, self.hostname, self.port, fresh)
+            outheaders = [
+                ('Host', self.hostname),
+                ('Accept-Encoding', 'gzip'),
+                ]
         if _json is not None:
             # overrides data
             data = json.dumps(_json)
@@ -849,7 +1336,16 @@ class HTTP:
         assert self.connected
 
         while True:
-            event = await self.next_event()
+            try:
+                event = await self.next_event()
+            except (OSError, h11.RemoteProtocolError):
+                if not self.retryable():
+                    raise
+                await self.retry()
+                continue
+            if type(event) is h11.ConnectionClosed and self.retryable():
+                await self.retry()
+                continue
             if type(event) is h11.Response:
                 self.response = event
                 ce = dict(event.headers).get(b'content-encoding')
@@ -864,16 +1360,26 @@ class HTTP:
                         '%s', f'decompressor is {self.decompressor!r}')
 
             elif type(event) is h11.Data:
-                data = bytes(event.data)
+                data = event.data
                 if self.decompressor is not None:
-                    data = self.decompressor.decompress(data)
+                    if OFFLOAD_THRESHOLD and len(data) >= OFFLOAD_THRESHOLD:
+                        data = await imbroglio.run_in_thread(
+                            self.decompressor.decompress, data)
+                    else:
+                        data = self.decompressor.decompress(data)
                 return data
             elif type(event) in (h11.EndOfMessage, h11.ConnectionClosed):
                 return None
 
     async def close(self):
-        self.log.debug('%s', 'closing {self.stream}')
-        await self.stream.close()
+        if self.pool is None:
+            self.log.debug('%s', 'closing {self.stream}')
+            await self.stream.close()
+        else:
+            await self.pool.release(
+                self.scheme, self.hostname, self.port, self.stream,
+                self.conn.our_state is h11.DONE
+                and self.conn.their_state is h11.DONE)
 
 
 class HTTP_WS:
@@ -318,6 +318,9 @@ class Window:
 
     def modeline(self):
         count = self.context.backends.count()
+        total = self.context.backends.count_total()
+        if total != count:
+            count = f'{count}/{total}'
         status = self.context.backends.statusline()
         if status:
             status += ' '
@@ -36,6 +36,7 @@ Backend for talking to `Zulip <https://zulip.org>`.
 
 import base64
 import re
+import sys
 import time
 import urllib.parse
 
@@ -45,6 +46,7 @@ from . import imbroglio
 from . import interactive
 from . import keymap
 from . import messages
+from . import sortedlist
 from . import text
 from . import util
 
@@ -106,7 +108,7 @@ class Zulip(messages.SnipeBackend, util.HTTP_JSONmixin):
     def __init__(self, context, url='https://chat.zulip.org', **kw):
         super().__init__(context, **kw)
         self.url = url.rstrip('/') + '/api/v1/'
-        self.messages = []
+        self.messages = sortedlist.SortedList()
         self.messages_by_id = {}
         self.backfilling = False
         self.loaded = False
@@ -203,15 +205,14 @@ class Zulip(messages.SnipeBackend, util.HTTP_JSONmixin):
                     await imbroglio.switch()
 
                 if msgs:
-                    self.messages.extend(msgs)
-                    self.drop_cache()
-                    await imbroglio.switch()
                     # make sure that the message list remains
                     # monotonically increasing by comparing the new
                     # messages (and the last old message) pairwise.
-                    self.readjust(self.messages[-len(msgs) - 1:])
+                    newest = self.newest()
+                    self.readjust(
+                        ([newest] if newest is not None else []) + msgs)
                     await imbroglio.switch()
-                    self.redisplay(msgs[0], msgs[-1])
+                    self.ingest(msgs)
         finally:
             self.connected.clear()
             self.state_set(messages.BackendState.DISCONNECTED)
@@ -294,9 +295,18 @@ class Zulip(messages.SnipeBackend, util.HTTP_JSONmixin):
                 if not msgs:
                     self.log.debug('loaded')
                     self.loaded = True
-            self.messages = msgs + self.messages
-            self.readjust(self.messages)
-            self.drop_cache()
+            self.readjust(msgs)
+            if msgs and self.messages:
+                # the old messages' times key the walk caches, so if the
+                # new ones collide with them, nudge the new ones back
+                after = self.messages[0]
+                for m in reversed(msgs):
+                    if m.time < after.time:
+                        break
+                    m.time = after.time - .0001
+                    after = m
+            self.messages.prepend(msgs)
+            self.cache_added(msgs)
         except Exception:
             self.log.exception('backfilling')
         finally:
@@ -317,22 +327,32 @@ class Zulip(messages.SnipeBackend, util.HTTP_JSONmixin):
 
 
 class ZulipMessage(messages.SnipeMessage):
+    __slots__ = ('stream', '_chat', 'subject', 'recipient')
+    # fields that take the same few values over and over
+    INTERN = (
+        'type', 'sender_email', 'sender_full_name', 'sender_short_name',
+        'sender_realm_str', 'subject', 'client', 'avatar_url',
+        )
+
     def __init__(self, backend, data):
         super().__init__(
             backend,
             data.get('content', ''),
             float(data.get('timestamp', time.time())),
             )
-        self.data = data
+        self.data = util.intern_values(data, self.INTERN)
+        self.stream = None
+        self._chat = None
+        self.subject = None
+        self.recipient = None
 
         sender = self.data.get('sender_email')
-        self._sender = ZulipAddress(backend, sender or '?')
         if sender:
             sender_set = {'; '.join((self.backend.name, sender))}
             self.backend._senders |= sender_set
             self.backend._destinations |= sender_set
         if self.data.get('type') == 'stream':
-            self.stream = str(self.data['display_recipient'])
+            self.stream = sys.intern(str(self.data['display_recipient']))
             self._chat = self.stream
             self.subject = str(self.data['subject'])
             self.backend._destinations |= {
@@ -354,6 +374,10 @@ class ZulipMessage(messages.SnipeMessage):
 
         backend.messages_by_id[data['id']] = self
 
+    def make_sender(self):
+        return ZulipAddress(
+            self.backend, self.data.get('sender_email') or '?')
+
     def update(self, event):
         self.backend.log.debug('updating %s: %s', self, event)
         data = dict(self.data)
@@ -367,6 +391,10 @@ class ZulipMessage(messages.SnipeMessage):
             data.pop('_rendered', None)
             data.pop('_html', None)
         self.data = data
+        self.changed()
+        # an edit can change what filters match, so the indexes and the
+        # filtered walk caches can't be trusted any more
+        self.backend.drop_cache()
         self.backend.log.debug('updated: %s', repr(self.data))
         self.backend.redisplay(self, self)
 
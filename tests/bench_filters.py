@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+# Copyright © 2017 the Snipe contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following
+# disclaimer in the documentation and/or other materials provided
+# with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+# TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+# THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+'''
+Compare compiled filters against walking the filter tree with _check,
+which is what every call used to do for a message the old per-filter memo
+hadn't seen.  "f(m)" is calling the filter object; "compiled" is calling
+its compiled function directly, as the walk loops do.
+
+Run it from the top of the tree:
+
+    PYTHONPATH=.:tests python3 tests/bench_filters.py
+'''
+
+import sys
+import timeit
+
+import mocks
+
+import snipe.filters as filters
+import snipe.roost as roost
+
+
+FILTERS = [
+    'personal',
+    'class = "help" or instance = "white-magic"',
+    'personal and not (sender = "bob" or body = /lunch/i)',
+    'filter personal',
+    ]
+
+
+def messages(count):
+    backend = roost.Roost(mocks.Context())
+    for i in range(count):
+        yield roost.RoostMessage(backend, {
+            'message': 'lunch?' if i % 7 else 'something else',
+            'receiveTime': i * 1000.0,
+            'time': i * 1000.0,
+            'sender': ('bob', 'alice', 'eve')[i % 3] + '@ATHENA.MIT.EDU',
+            'class': ('help', 'unhelp.d', 'lunch')[i % 3],
+            'instance': ('white-magic', 'personal')[i % 2],
+            'recipient': '' if i % 5 else 'me@ATHENA.MIT.EDU',
+            'opcode': '',
+            'signature': '',
+            })
+
+
+def main(count=10000):
+    msgs = list(messages(count))
+    msgs[0].backend.context.conf['filter'] = {'personal': 'personal'}
+    print('%d messages' % (count,))
+    for text in FILTERS:
+        f = filters.makefilter(text)
+        check, call, compiled = [
+            min(timeit.repeat(
+                lambda: [g(m) for m in msgs], number=1, repeat=7))
+            for g in (f._check, f, f.compile())]
+        print(
+            '%-55s _check %.4fs f(m) %.4fs (%.1fx) compiled %.4fs (%.1fx)'
+            % (text, check, call, check / call, compiled, check / compiled))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,162 @@
+# -*- encoding: utf-8 -*-
+# Copyright © 2017 the Snipe contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following
+# disclaimer in the documentation and/or other materials provided
+# with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+# TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+# THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+'''
+Measure how much memory a message takes up in each of the backends.
+
+Run it from the top of the tree:
+
+    PYTHONPATH=.:tests python3 tests/bench_messages.py
+'''
+
+import gc
+import json
+import sys
+import tracemalloc
+
+import mocks
+
+import snipe.context as context
+
+import snipe.irccloud as irccloud
+import snipe.roost as roost
+import snipe.slack as slack
+import snipe.zulip as zulip
+
+
+SENDERS = ('bob', 'alice', 'eve', 'mallory')
+BODY = 'is anyone going to lunch?  I was thinking about the place on Main St.'
+
+
+def wire(payloads):
+    # as though each had just been decoded off the network, so that none
+    # of the strings are shared to begin with
+    return [json.loads(json.dumps(p)) for p in payloads]
+
+
+def roost_messages(count):
+    backend = roost.Roost(mocks.Context())
+    payloads = wire({
+        'message': BODY,
+        'receiveTime': i * 1000.0,
+        'time': i * 1000.0,
+        'sender': SENDERS[i % 4] + '@ATHENA.MIT.EDU',
+        'class': ('help', 'unhelp.d', 'lunch')[i % 3],
+        'instance': ('white-magic', 'personal')[i % 2],
+        'recipient': '',
+        'opcode': '',
+        'signature': SENDERS[i % 4].title() + ' Q. User',
+        'auth': 'YES',
+        'realm': 'ATHENA.MIT.EDU',
+        } for i in range(count))
+    return [roost.RoostMessage(backend, p) for p in payloads]
+
+
+def slack_messages(count):
+    backend = slack.Slack(None, name='lunch')
+    for (i, name) in enumerate(SENDERS):
+        backend.dests['U%d' % (i,)] = slack.SlackDest(
+            backend, 'user', {'name': name})
+    backend.dests['C0'] = slack.SlackDest(
+        backend, 'channel', {'name': 'general', 'is_member': True})
+    payloads = wire({
+        'type': 'message',
+        'user': 'U%d' % (i % 4,),
+        'channel': 'C0',
+        'text': BODY + ' <@U%d>' % ((i + 1) % 4,),
+        'ts': '%d.000100' % (i,),
+        'team': 'T0',
+        } for i in range(count))
+    return [slack.SlackMessage(backend, p) for p in payloads]
+
+
+def zulip_messages(count):
+    backend = zulip.Zulip(context.Context())
+    payloads = wire({
+        'id': i,
+        'timestamp': float(i),
+        'content': BODY,
+        'sender_email': SENDERS[i % 4] + '@example.com',
+        'sender_full_name': SENDERS[i % 4].title(),
+        'type': 'stream',
+        'display_recipient': 'lunch',
+        'subject': 'today',
+        'client': 'website',
+        } for i in range(count))
+    return [zulip.ZulipMessage(backend, p) for p in payloads]
+
+
+def irccloud_messages(count):
+    backend = irccloud.IRCCloud(None)
+    backend.connections[1] = {'hostname': 'irc.example.com'}
+    backend.buffers[1] = {'name': '#lunch'}
+    payloads = wire({
+        'type': 'buffer_msg',
+        'eid': i * 1000000,
+        'cid': 1,
+        'bid': 1,
+        'chan': '#lunch',
+        'from': SENDERS[i % 4],
+        'from_name': SENDERS[i % 4],
+        'from_host': 'example.com',
+        'msg': BODY,
+        } for i in range(count))
+    return [irccloud.IRCCloudMessage(backend, p) for p in payloads]
+
+
+def measure(make, count):
+    # includes decoding the payloads, since messages hang on to them
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    msgs = make(count)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    for m in msgs:  # what displaying them all would pull in
+        m.sender, m.body
+    touched = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(msgs), (touched - before) / len(msgs)
+
+
+def main(count=10000):
+    print('%d messages' % (count,))
+    for name, setup in [
+            ('roost', roost_messages),
+            ('slack', slack_messages),
+            ('zulip', zulip_messages),
+            ('irccloud', irccloud_messages),
+            ]:
+        made, touched = measure(setup, count)
+        print('%-10s %6.0f bytes/message, %6.0f once displayed' % (
+            name, made, touched))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
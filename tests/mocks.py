@@ -53,6 +53,7 @@ class Backend:
     index = ''
     AUTO_FILL = True
     SOFT_NEWLINES = False
+    display_generation = 0
 
 
 class Aggregator:
@@ -85,6 +86,8 @@ class Aggregator:
     def count(self):
         return len(self._messages)
 
+    count_total = count
+
     async def send(self, params, body):
         self._sent.append((params, body))
 
@@ -107,6 +110,8 @@ class Aggregator:
 @functools.total_ordering
 class Message:
     time_counter = itertools.count()
+    rendered = None
+    display_generation = 0
 
     def __init__(self, **kw):
         self.dict = kw
@@ -264,6 +269,8 @@ class UI:
         self.windows = []
         self.active = 0
         self.color_assigner = snipe.ttycolor.NoColorAssigner()
+        self.layouts = snipe.ttyfe.LayoutCache()
+        self.attrs = {}
 
 
 class Window:
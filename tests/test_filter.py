@@ -40,6 +40,8 @@ import unittest
 import mocks
 
 import snipe.filters
+import snipe.messages
+import snipe.util
 
 from snipe.filters import (
     And, Compare, Identifier, Lexer, No, Not, Or, Parser, RECompare,
@@ -351,6 +353,108 @@ class TestFilters(unittest.TestCase):
         self.assertEqual(
             str(snipe.filters.FilterLookup('foo')), 'filter foo')
 
+    def test_FilterLookup_resolve(self):
+        m = mocks.Message(foo=1)
+        m.conf['filter'] = {
+            'a': 'foo = 1',
+            'b': 'filter a and filter a',
+            'c': 'filter b or filter d',
+            'd': 'filter c',
+            }
+        f = snipe.filters.FilterLookup('b')
+        resolved = f.resolve(m.conf)
+        self.assertTrue(resolved(m))
+        self.assertIs(resolved, f.resolve(m.conf))
+        self.assertTrue(f._check(m))
+
+        # edits are noticed once the configuration is marked as changed,
+        # as Context.conf_write does
+        m.conf['filter']['a'] = 'foo = 2'
+        self.assertIs(resolved, f.resolve(m.conf))
+        snipe.util.Configurable.generation += 1
+        self.assertIsNot(resolved, f.resolve(m.conf))
+        self.assertFalse(f._check(m))
+        del m.conf['filter']['a']
+        snipe.util.Configurable.generation += 1
+        self.assertFalse(f._check(m))
+
+        # as is a different configuration
+        other = mocks.Message(foo=1)
+        other.conf['filter'] = {'b': 'foo = 1'}
+        self.assertTrue(f(other))
+        self.assertFalse(f(m))
+
+        m.conf['filter']['a'] = 'yes'
+        snipe.util.Configurable.generation += 1
+        self.assertTrue(snipe.filters.FilterLookup('d')._check(m))
+        self.assertTrue(makefilter('no or filter c')._check(m))
+        self.assertTrue(makefilter('no or filter c').compile()(m))
+        m.conf['filter']['a'] = 'no'
+        snipe.util.Configurable.generation += 1
+        self.assertFalse(snipe.filters.FilterLookup('d')._check(m))
+        self.assertFalse(makefilter('no or filter c')(m))
+
+    def test_compile(self):
+        class Canonical(snipe.messages.SnipeMessage):
+            def canon(self, field, value):
+                return value.lower() if field == 'who' else value
+
+        class Shouty(snipe.messages.SnipeMessage):
+            # fills in the field tables, but doesn't return what's in them
+            def field(self, name, canon=True):
+                return str(super().field(name, canon)).upper()
+
+        msgs = []
+        for i, cls in enumerate(
+                [snipe.messages.SnipeMessage, Canonical, Shouty] * 2):
+            m = cls(None, 'body %d' % (i,), float(i))
+            m.data = {'who': 'Bob' if i % 3 else 'alice', 'n': i}
+            m.personal = bool(i % 2)
+            msgs.append(m)
+        msgs.append(mocks.Message(who='bob', Who='Bob', n=3))
+
+        for text in [
+                'yes',
+                'no',
+                'personal',
+                'not personal',
+                'who = "bob"',
+                'who == "Bob"',
+                'who != "alice"',
+                'n < 3 or n >= 5',
+                'n > "x"',
+                'who = n',
+                'body = /BODY [12]/i',
+                'body != /body 1/',
+                'body = /bad[/',
+                'personal xor n > 2 xor who = "bob"',
+                'personal and (n = 1 or n = 5) and not who = "alice"',
+                '$"m.time > 2"',
+                ]:
+            f = makefilter(text)
+            compiled = f.compile()
+            self.assertIs(compiled, f.compile())
+            for m in msgs:
+                self.assertEqual(
+                    bool(f._check(m)), compiled(m), (text, m.data))
+                self.assertEqual(bool(f._check(m)), f(m), (text, m.data))
+
+        self.assertIn('_filter', makefilter('personal').compile().source)
+
+        # calling the filter goes straight to the compiled function
+        f = snipe.filters.Not(snipe.filters.Yes())
+        self.assertFalse(f(msgs[0]))
+        self.assertIs(f.compile(), f._call)
+        self.assertIs(f.compile(), snipe.filters.compiled(f))
+        self.assertIs(len, snipe.filters.compiled(len))
+
+        f = makefilter('who = "bob"')
+        m = msgs[1]
+        self.assertTrue(f(m))
+        m.data['who'] = 'alice'
+        m.changed()
+        self.assertFalse(f(m))
+
     def test_validate(self):
         self.assertTrue(snipe.filters.validatefilter('yes'))
         self.assertFalse(snipe.filters.validatefilter('and and and nope'))
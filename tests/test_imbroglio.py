@@ -32,8 +32,10 @@
 Unit tests for the imbroglio core
 '''
 
+import selectors
 import signal
 import socket
+import threading
 import time
 import unittest
 
@@ -174,6 +176,83 @@ class TestImbroglioCore(unittest.TestCase):
             a.close()
             b.close()
 
+    def test_wait_shared_fd(self):
+        # a reader and a writer on the same socket, and a reader that
+        # times out, with the selector registration following along
+
+        a, b = socket.socketpair()
+
+        try:
+            async def reader():
+                timedout, duration = await imbroglio.readwait(a)
+                self.assertFalse(timedout)
+                self.assertEqual(b'X', a.recv(1))
+
+            async def impatient():
+                timedout, duration = await imbroglio.readwait(a, .1)
+                self.assertTrue(timedout)
+
+            async def driver():
+                supervisor = await imbroglio.get_supervisor()
+                await imbroglio.spawn(reader())
+                await imbroglio.spawn(impatient())
+                await imbroglio.sleep()
+                self.assertEqual(
+                    supervisor.selector.get_key(a).events,
+                    selectors.EVENT_READ)
+                self.assertEqual(2, len(supervisor.fd_waiters[a]))
+
+                await imbroglio.sleep(.2)
+                self.assertEqual(1, len(supervisor.fd_waiters[a]))
+
+                timedout, duration = await imbroglio.writewait(a, 10)
+                self.assertFalse(timedout)
+                self.assertEqual(1, len(supervisor.fd_waiters[a]))
+
+                b.send(b'X')
+                await imbroglio.sleep(.1)
+                self.assertEqual({}, supervisor.fd_waiters)
+                self.assertEqual({}, supervisor.selector.get_map())
+
+            imbroglio.run(driver())
+        finally:
+            a.close()
+            b.close()
+
+    def test_many_waiters(self):
+        # lots of sleepers, roused early, and lots of taskwaiters
+        woken = []
+
+        async def sleeper(i):
+            timedout, duration = await imbroglio.sleep(60)
+            self.assertFalse(timedout)
+            woken.append(i)
+
+        async def waiter(t):
+            timedout, duration = await imbroglio.taskwait(t, 60)
+            self.assertFalse(timedout)
+
+        async def driver():
+            supervisor = await imbroglio.get_supervisor()
+            sleepers = [
+                await imbroglio.spawn(sleeper(i)) for i in range(500)]
+            waiters = [await imbroglio.spawn(waiter(t)) for t in sleepers]
+            await imbroglio.sleep()
+            self.assertEqual(1000, len(supervisor.waiting))
+            for t in sleepers:
+                t.rouse()
+            await imbroglio.sleep(.1)
+            self.assertTrue(all(t.is_done() for t in waiters))
+            self.assertEqual({}, supervisor.task_waiters)
+            self.assertEqual(
+                [], [t for t in supervisor.timers if supervisor._live(t[2])])
+            self.assertLess(len(supervisor.timers), 1000)
+
+        t0 = time.monotonic()
+        imbroglio.run(driver())
+        self.assertLess(time.monotonic() - t0, 10)
+        self.assertEqual(list(range(500)), sorted(woken))
+
     def test_exception(self):
         async def keyerror():
             {}[None]
@@ -587,6 +666,67 @@ class TestImbroglioTools(unittest.TestCase):
 
         imbroglio.run(check_raise())
 
+    def test_thread_pool(self):
+        pool = imbroglio.ThreadPool(2)
+        threads = set()
+
+        def work(i):
+            threads.add(threading.get_ident())
+            time.sleep(.1)
+            return i
+
+        async def run():
+            supervisor = await imbroglio.get_supervisor()
+            results = await imbroglio.gather(
+                *[pool.run(work, i) for i in range(6)])
+            self.assertEqual(list(range(6)), results)
+            self.assertIsNone(pool.reaper)
+            self.assertEqual({}, supervisor.task_waiters)
+
+        imbroglio.run(run())
+
+        self.assertEqual(2, len(threads))
+        stats = pool.stats()
+        self.assertEqual(2, stats['workers'])
+        self.assertEqual(6, stats['completed'])
+        self.assertEqual(0, stats['outstanding'])
+        self.assertGreaterEqual(stats['max_queued'], 4)
+
+        # threads are reused the next time around
+        imbroglio.run(pool.run(work, 0))
+        self.assertEqual(2, len(threads))
+
+        pool.resize(1)
+        for i in range(100):
+            if pool.stats()['workers'] == 1:
+                break
+            time.sleep(.01)
+        self.assertEqual(1, pool.stats()['workers'])
+        self.assertEqual(7, imbroglio.run(pool.run(work, 7)))
+
+    def test_thread_pool_abandoned(self):
+        pool = imbroglio.ThreadPool(1)
+
+        def work(i):
+            time.sleep(.1)
+            return i
+
+        async def interrupted():
+            await imbroglio.spawn(pool.run(work, 1))
+            await imbroglio.sleep(.01)
+            raise KeyboardInterrupt
+
+        # the supervisor goes away with a call outstanding
+        with self.assertRaises(KeyboardInterrupt):
+            imbroglio.run(interrupted())
+        self.assertIsNotNone(pool.reaper)
+
+        async def again():
+            async with imbroglio.Timeout(5):
+                return await pool.run(work, 2)
+
+        self.assertEqual(2, imbroglio.run(again()))
+
     def test_process_filter(self):
         async def test():
             self.assertEqual(
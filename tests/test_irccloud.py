@@ -204,6 +204,20 @@ class TestIRCCloud(unittest.TestCase):
         self.assertEqual(1, l[0].data['eid'])
         self.assertEqual(2, l[1].data['eid'])
 
+        # unknown connection: rejected before it's kept
+        with self.assertRaises(KeyError):
+            await i.process_message(l, {
+                'type': 'buffer_msg',
+                'bid': 1,
+                'cid': 99,
+                'eid': 3,
+                'from': 'user',
+                'from_name': 'user',
+                'from_host': 'host',
+                'msg': 'message body',
+                })
+        self.assertEqual(2, len(l))
+
     @imbroglio.test
     async def test_incoming(self):
         i = irccloud.IRCCloud(None)
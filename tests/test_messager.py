@@ -84,6 +84,61 @@ class TestMessager(unittest.TestCase):
             ({'visible', 'bar'}, '[()]\n'),
             [chunk.tagsets() for (mark, chunk) in w.view(0)][0][0])
 
+    def test_view_cache(self):
+        f = mocks.FE()
+        w = messager.Messager(f)
+        m = f.context.backends._messages[0]
+        displayed = []
+
+        def display(decoration):
+            displayed.append(decoration)
+            return chunks.Chunk([((), 'foo\n')])
+        m.display = display
+
+        def view():
+            return [chunk.tagsets() for (mark, chunk) in w.view(0)]
+
+        first = view()
+        self.assertEqual(first, view())
+        self.assertEqual(1, len(displayed))
+
+        m.rendered = None  # as changed() would
+        self.assertEqual(first, view())
+        self.assertEqual(2, len(displayed))
+
+        w.rules_reset()
+        view()
+        self.assertEqual(2, len(displayed))  # nothing changed
+
+        f.context.conf['rule'] = [('yes', {'foreground': 'red'})]
+        w.rules_reset()
+        view()
+        self.assertEqual(3, len(displayed))
+
+        util.Configurable.generation += 1
+        view()
+        self.assertEqual(4, len(displayed))
+
+        m.display_generation += 1
+        view()
+        self.assertEqual(5, len(displayed))
+
+        # named filters the rules might use
+        f.context.conf.setdefault('filter', {})['mine'] = 'yes'
+        view()
+        self.assertEqual(6, len(displayed))
+        view()
+        self.assertEqual(6, len(displayed))
+
+        # another window with the same rules doesn't start over
+        other = messager.Messager(f)
+        self.assertEqual(first, [
+            chunk.tagsets() for (mark, chunk) in other.view(0)])
+        self.assertEqual(6, len(displayed))
+        other.filter_clear_decorate({'foreground': 'green'})
+        list(other.view(0))
+        self.assertEqual(7, len(displayed))
+
     def test_view_search(self):
         f = mocks.FE()
         w = messager.Messager(f)
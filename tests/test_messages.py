@@ -36,6 +36,7 @@ import collections
 import datetime
 import itertools
 import os
+import tempfile
 import time
 import unittest
 
@@ -45,6 +46,7 @@ import snipe.chunks as chunks
 import snipe.filters as filters
 import snipe.imbroglio as imbroglio
 import snipe.messages as messages
+import snipe.sortedlist as sortedlist
 import snipe.util as util
 
 
@@ -105,9 +107,11 @@ class TestMessage(unittest.TestCase):
 
         self.assertEqual(float(m), m.time)
 
+        m.rendered = ('key', 'chunk')
         m.transform('foo', 'bar')
         self.assertEqual(m.transformed, 'foo')
         self.assertEqual(m.body, 'bar')
+        self.assertIsNone(m.rendered)
 
         self.assertIs(
             m.get_decor({'decor': 'test_messages.TestMessage'}),
@@ -117,6 +121,64 @@ class TestMessage(unittest.TestCase):
             m.get_decor({'decor': 'nonexistent.object'}),
             messages.SnipeMessage.Decor)
 
+    def test_compact(self):
+        s = SyntheticBackend(mocks.Context(), 'synthetic')
+
+        class LazyMessage(messages.SnipeMessage):
+            __slots__ = ()
+            made = 0
+
+            def make_body(self):
+                LazyMessage.made += 1
+                return 'lazy'
+
+        m = LazyMessage(s, None, 0.0)
+        self.assertFalse(hasattr(m, '__dict__'))
+        self.assertEqual(0, LazyMessage.made)
+        self.assertEqual('lazy', m.body)
+        self.assertEqual('lazy', m.field('body'))
+        self.assertEqual(1, LazyMessage.made)
+        m.body = None
+        self.assertEqual('lazy', m.body)
+        self.assertEqual(2, LazyMessage.made)
+
+        self.assertEqual('', messages.SnipeMessage(s, None).body)
+
+        data = {'a': ''.join(['fo', 'o']), 'b': 5}
+        util.intern_values(data, ['a', 'b', 'c'])
+        self.assertIs(data['a'], 'foo')
+        self.assertEqual({'a': 'foo', 'b': 5}, data)
+
+    def test_field_table(self):
+        s = SyntheticBackend(mocks.Context(), 'synthetic')
+
+        class LowerMessage(messages.SnipeMessage):
+            @staticmethod
+            def canon(field, value):
+                return value.lower()
+
+        m = LowerMessage(s, 'foo', 0.0)
+        m.data['class'] = 'Foo'
+
+        self.assertEqual('foo', m.field('class'))
+        self.assertEqual('Foo', m.field('class', False))
+        self.assertEqual({'class': 'foo'}, m.field_table())
+        self.assertEqual({'class': 'Foo'}, m.field_table(False))
+
+        # not worked out again
+        m.data['class'] = 'Bar'
+        self.assertEqual('foo', m.field('class'))
+        getter = filters.field_getter(LowerMessage, 'class')
+        self.assertEqual('foo', getter(m))
+
+        m.changed()
+        self.assertEqual('bar', m.field('class'))
+
+        m.data['class'] = 'Baz'
+        s.display_generation += 1
+        self.assertEqual('baz', getter(m))
+        self.assertEqual({'class': 'baz'}, m.field_table())
+
 
 class TestDecor(unittest.TestCase):
     def test_decotags(self):
@@ -270,6 +332,303 @@ class TestBackend(unittest.TestCase):
         self.assertFalse(s.tasks)
         self.assertTrue(t.is_done())
 
+    @imbroglio.test
+    async def test_store(self):
+        class StoringBackend(SyntheticBackend):
+            STORABLE = True
+
+            def message_data(self, msg):
+                return {'id': msg.data['id'], 'body': msg.body}
+
+            async def message_restore(self, data):
+                m = messages.SnipeMessage(self, data['body'])
+                m.data = data
+                return m
+
+        with tempfile.TemporaryDirectory() as directory:
+            context = mocks.Context()
+            context.directory = directory
+            context.ensure_directory = lambda: None
+            s = StoringBackend(context, conf={'count': 3})
+            await s.start()
+            self.assertIsNone(s.store)
+
+            context.conf['set'] = {'message.persist': True}
+            s = StoringBackend(context, conf={'count': 3})
+            await s.start()
+            self.assertIsNotNone(s.store)
+            for (i, m) in enumerate(s.messages):
+                m.data['id'] = i
+            s.store_add(s.messages)
+            s.store_add(s.messages)
+            self.assertEqual(3, len(s.store))
+            await s.shutdown()
+            self.assertIsNone(s.store)
+
+            t = StoringBackend(context)
+            t.store_open()
+            ms = await t.store_before(s.messages[2].time, 5)
+            self.assertEqual(
+                [m.body for m in s.messages[:2]], [m.body for m in ms])
+            self.assertEqual(
+                [m.time for m in s.messages[:2]], [m.time for m in ms])
+
+    @imbroglio.test
+    async def test_evict(self):
+        class StoringBackend(SyntheticBackend):
+            STORABLE = True
+            RESIDENT_MARGIN = 2
+
+            async def message_restore(self, data):
+                m = messages.SnipeMessage(self, data['body'])
+                m.data = data
+                return m
+
+        with tempfile.TemporaryDirectory() as directory:
+            context = mocks.Context()
+            context.ui = mocks.UI()
+            context.directory = directory
+            context.ensure_directory = lambda: None
+            context.conf['set'] = {
+                'message.persist': True, 'message.resident_max': 8}
+            s = StoringBackend(context, conf={'count': 20})
+            await s.start()
+            s.messages = sortedlist.SortedList(s.messages)
+            everything = list(s.messages)
+            for (i, m) in enumerate(everything):
+                m.data['id'] = i
+                m.data['body'] = m.body
+
+            # nothing is evicted that isn't stored
+            self.assertEqual(0, s.evict())
+            s.store_add(everything[:10])
+            self.assertEqual(10, s.evict())
+            self.assertEqual(everything[10:], list(s.messages))
+            self.assertEqual(10, s.count())
+            self.assertEqual(20, s.count_total())
+
+            # or that's near a cursor
+            s.store_add(everything)
+            window = mocks.Window([])
+            window.cursor = everything[13]
+            renderer = mocks.Renderer()
+            renderer.window = window
+            context.ui.windows = [renderer]
+            self.assertEqual(1, s.evict())
+            self.assertEqual(everything[11:], list(s.messages))
+
+            # and evicted messages come back through the store
+            ms = await s.store_before(s.messages[0].time, 4)
+            self.assertEqual(
+                [m.body for m in everything[7:11]], [m.body for m in ms])
+            self.assertEqual(9, s.count())
+            self.assertEqual(20, s.count_total())
+
+    @imbroglio.test
+    async def test_gaps(self):
+        context = mocks.Context()
+        s = SyntheticBackend(context, conf={'count': 5})
+        await s.start()
+        filled = []
+        s.fill_gap = filled.append
+        gap = (s.messages[1].time, s.messages[2].time)
+        s.gap_add(*gap)
+
+        list(s.walk(float('-inf'), True, search=True))
+        self.assertEqual([], filled)
+        list(s.walk(s.messages[2], False))
+        self.assertEqual([gap, gap], filled)
+
+        s.gap_remove(gap)
+        self.assertEqual({}, s.gaps)
+
+    @imbroglio.test
+    async def test_cache_added(self):
+        context = mocks.Context()
+        s = SyntheticBackend(context, conf={'count': 20})
+        await s.start()
+        s.messages = sortedlist.SortedList(s.messages)
+        odd = filters.Python('int(m.time) % 2')
+
+        def walks(backend=s):
+            return [
+                [m.time for m in backend.walk(start, forward, mfilter=f)]
+                for start in (float('-inf'), s.messages[10], float('inf'))
+                for forward in (True, False)
+                for f in (None, odd)]
+
+        def fresh():
+            t = SyntheticBackend(context)
+            t.messages = s.messages
+            return walks(t)
+
+        walks()
+        self.assertTrue(s.adjcache)
+        self.assertTrue(s.tailadjs)
+        self.assertTrue(s.headadjs)
+
+        now = s.messages[-1].time
+        new = [messages.SnipeMessage(s, 'new', now + i) for i in (1, 2, 3)]
+        s.messages.extend(new)
+        s.cache_added(new)
+        self.assertEqual(fresh(), walks())
+
+        then = s.messages[0].time
+        old = [messages.SnipeMessage(s, 'old', then - i) for i in (3, 2, 1)]
+        s.messages.prepend(old)
+        s.cache_added(old)
+        self.assertEqual(0, s.cache_base - 3)
+        self.assertTrue(s.adjcache)
+        self.assertEqual(fresh(), walks())
+
+        middle = [messages.SnipeMessage(s, 'middle', now - 2.5)]
+        s.messages.merge(middle)
+        s.cache_added(middle)
+        self.assertFalse(s.adjcache)
+        self.assertEqual(fresh(), walks())
+
+    @imbroglio.test
+    async def test_ingest(self):
+        context = mocks.Context()
+        s = SyntheticBackend(context, conf={'count': 10})
+        await s.start()
+        s.messages = sortedlist.SortedList(s.messages)
+        redisplays = []
+        s.redisplay = lambda m1, m2: redisplays.append((m1, m2))
+        list(s.walk(float('-inf'), True))
+
+        now = s.messages[-1].time
+        new = [messages.SnipeMessage(s, 'new', now + i) for i in (1, 2, 3)]
+        for m in new:
+            s.ingest([m])
+        self.assertIs(new[-1], s.newest())
+        self.assertEqual(10, len(s.messages))
+        self.assertEqual([], redisplays)
+
+        await imbroglio.sleep(s.INGEST_WINDOW * 2)
+        self.assertEqual(13, len(s.messages))
+        self.assertEqual(new, list(s.messages)[-3:])
+        self.assertEqual([(new[0], new[-1])], redisplays)
+        self.assertEqual(
+            list(s.messages), list(s.walk(float('-inf'), True)))
+
+        # already added, and a duplicate that gets dropped
+        redisplays.clear()
+        later = messages.SnipeMessage(s, 'later', now + 4)
+        s.messages.append(later)
+        s.ingest([later], added=True)
+        s.ingest([messages.SnipeMessage(s, 'dup', now + 1)])
+        s.ingest_flush()
+        self.assertEqual(14, len(s.messages))
+        self.assertEqual([(new[0], later)], redisplays)
+        self.assertEqual(
+            list(s.messages), list(s.walk(float('-inf'), True)))
+
+        # walked over before the flush
+        redisplays.clear()
+        list(s.walk(0.0, True))
+        latest = messages.SnipeMessage(s, 'latest', now + 4.5)
+        s.messages.append(latest)
+        s.ingest([latest], added=True)
+        self.assertEqual(
+            list(s.messages), list(s.walk(0.0, True)))
+        self.assertEqual([], redisplays)
+        s.ingest_flush()
+        self.assertEqual([(latest, latest)], redisplays)
+        self.assertEqual(
+            list(s.messages),
+            list(itertools.islice(s.walk(0.0, True), len(s.messages) + 1)))
+        self.assertEqual(
+            list(reversed(s.messages)),
+            list(itertools.islice(
+                s.walk(float('inf'), False), len(s.messages) + 1)))
+
+        # a big enough burst doesn't wait
+        redisplays.clear()
+        s.INGEST_MAX = 2
+        s.ingest([messages.SnipeMessage(s, 'x', now + i) for i in (5, 6)])
+        self.assertEqual(17, len(s.messages))
+        self.assertEqual(1, len(redisplays))
+
+    @imbroglio.test
+    async def test_filter_index(self):
+        context = mocks.Context()
+        s = SyntheticBackend(context, conf={'count': 50})
+        await s.start()
+        s.messages = sortedlist.SortedList(s.messages)
+        s.INDEX_THRESHOLD = 10
+        s.INDEX_SLICE = 7
+        odd = filters.Python('int(m.time) % 2')
+
+        def walks(backend=s):
+            return [
+                [m.time for m in backend.walk(start, forward, mfilter=odd)]
+                for start in (float('-inf'), s.messages[10], float('inf'))
+                for forward in (True, False)]
+
+        def fresh():
+            t = SyntheticBackend(context)
+            t.messages = s.messages
+            return walks(t)
+
+        self.assertEqual(fresh(), walks())
+        self.assertEqual(1, len(s.indexes))
+        index = s.indexes[odd]
+        self.assertFalse(index.ready)
+        await s.tasks[-1]
+        self.assertTrue(index.ready)
+        self.assertEqual(25, len(index))
+
+        def matching():
+            return sum(1 for m in s.messages if int(m.time) % 2)
+
+        self.assertIs(index, s.filter_index(odd))
+        self.assertIsNone(s.filter_index(messages.accept))
+        self.assertEqual(fresh(), walks())
+
+        now = s.messages[-1].time
+        new = [messages.SnipeMessage(s, 'new', now + i) for i in (1, 2, 3)]
+        s.messages.extend(new)
+        s.cache_added(new)
+        self.assertEqual(matching(), len(index))
+
+        old = [messages.SnipeMessage(s, 'old', s.messages[0].time - 1)]
+        s.messages.prepend(old)
+        s.cache_added(old)
+        self.assertEqual(matching(), len(index))
+        self.assertEqual(fresh(), walks())
+
+        s.drop_cache()
+        self.assertFalse(s.indexes)
+
+    def test_simplify(self):
+        context = mocks.Context()
+        context.conf['filter'] = {'odd': 'backend == "synthetic" and odd'}
+        s = SyntheticBackend(context)
+        f = filters.makefilter('filter odd and even')
+
+        simple = s.simplify(f)
+        self.assertIsInstance(simple, filters.And)
+        self.assertIs(simple, s.simplify(f))
+        self.assertIs(simple, s.simplify(filters.makefilter(str(f))))
+        self.assertIs(False, s.simplify(filters.makefilter('backend == "x"')))
+
+        # a named filter changing means simplifying again
+        context.conf['filter']['odd'] = 'backend == "x"'
+        self.assertIs(False, s.simplify(f))
+        self.assertIs(False, s.simplify(f))
+
+        context.conf['filter']['odd'] = 'backend == "synthetic" and odd'
+        simple = s.simplify(f)
+        self.assertIs(simple, s.simplify(f))
+        util.Configurable.generation += 1
+        self.assertIsNot(simple, s.simplify(f))
+
+        s.SIMPLIFY_MAX = 2
+        s.simplify(filters.makefilter('yes'))
+        s.simplify(filters.makefilter('no'))
+        self.assertEqual(2, len(s.simplified))
+
     def test_redisplay(self):
         s = SyntheticBackend(mocks.Context())
         s.context.ui = mocks.FE()
@@ -144,13 +144,13 @@ class TestRoost(unittest.TestCase):
     def test_add_message(self):
         r = roost.Roost(mocks.Context())
 
-        r.drop_cache = Mock()
+        r.cache_added = Mock()
         r.redisplay = Mock()
 
         m = messages.SnipeMessage(r, 'foo', 1.0)
         r.add_message(m)
 
-        r.drop_cache.assert_called()
+        r.cache_added.assert_called_with([m])
         r.redisplay.assert_called_with(m, m)
 
         m = messages.SnipeMessage(r, 'bar', 1.0)
@@ -254,6 +254,59 @@ class TestRoost(unittest.TestCase):
         await r.dump_subscriptions(w)
         w.show.assert_called_with('class instance *')
 
+    @imbroglio.test
+    async def test_jump(self):
+        context = mocks.Context()
+        context.ui = mocks.FE()
+        r = roost.Roost(context)
+
+        def zephyr(t):
+            return {
+                'id': 'id%d' % (t,),
+                'message': 'at %d' % (t,),
+                'receiveTime': t * 1000.0,
+                'sender': 'sender',
+                'class': 'class',
+                'instance': 'instance',
+                'recipient': '',
+                'opcode': '',
+                'signature': 'sig',
+                'time': t * 1000.0,
+                }
+
+        def chunk(*times, done=False):
+            return mocks.promise({
+                'messages': [zephyr(t) for t in times], 'isDone': done})
+
+        r.messages.prepend([
+            await r.construct_and_maybe_decrypt(zephyr(t))
+            for t in (1000, 1001)])
+
+        r.r.bytime = Mock(return_value=mocks.promise({'id': 'id100'}))
+        r.r.messages = Mock(side_effect=[chunk(100, 101), chunk(99, 98)])
+        await r.do_jump(100.5)
+        r.r.bytime.assert_called_with(100500)
+        self.assertEqual(
+            [98, 99, 100, 101, 1000, 1001], [m.time for m in r.messages])
+        gap = (101, 1000)
+        self.assertEqual({101: gap, 1000: gap}, r.gaps)
+        self.assertFalse(r.backfilling)
+
+        r.r.messages = Mock(side_effect=[chunk(900, 800)])
+        await r.do_fill_gap(gap)
+        r.r.messages.assert_called_with('id1000', r.chunksize)
+        gap = (101, 800)
+        self.assertEqual({101: gap, 800: gap}, r.gaps)
+
+        r.r.messages = Mock(side_effect=[chunk(700, 101, 100)])
+        await r.do_fill_gap(gap)
+        r.r.messages.assert_called_with('id800', r.chunksize)
+        self.assertEqual({}, r.gaps)
+        self.assertEqual(
+            [98, 99, 100, 101, 700, 800, 900, 1000, 1001],
+            [m.time for m in r.messages])
+        self.assertFalse(r.loaded)
+
     def test_spec_to_triplets(self):
         self.assertEqual(
             [('class', 'instance', 'recipient@REALM')],
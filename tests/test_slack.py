@@ -670,6 +670,13 @@ class TestSlackMessage(unittest.TestCase):
         self.assertTrue(m.noise)
         self.assertEqual('test; user', m.followup())
 
+        self.assertRaises(KeyError, lambda: slack.SlackMessage(s, {
+            'ts': 0.0,
+            'user': 'NOBODY',
+            'type': 'presence_change',
+            'presence': 'out',
+            }))
+
     @imbroglio.test
     async def test_slackmarkup(self):
         s = slack.Slack(None, name='test')
@@ -711,15 +718,17 @@ class TestSlackMessage(unittest.TestCase):
         m = slack.SlackMessage(s, {'type': 'message', 'channel': 'foo'})
         o = object()
 
-        m.react = Mock(return_value=mocks.promise())
-
-        await m.add_reaction(o)
-        m.react.assert_called_with(o, 'reactions.add')
-
-        m.react = Mock(return_value=mocks.promise())
-
-        await m.remove_reaction(o)
-        m.react.assert_called_with(o, 'reactions.remove')
+        with patch.object(
+                slack.SlackMessage, 'react',
+                return_value=mocks.promise()) as react:
+            await m.add_reaction(o)
+            react.assert_called_with(o, 'reactions.add')
+
+        with patch.object(
+                slack.SlackMessage, 'react',
+                return_value=mocks.promise()) as react:
+            await m.remove_reaction(o)
+            react.assert_called_with(o, 'reactions.remove')
 
     @imbroglio.test
     async def test_react(self):
@@ -0,0 +1,133 @@
+# -*- encoding: utf-8 -*-
+# Copyright © 2017 the Snipe contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following
+# disclaimer in the documentation and/or other materials provided
+# with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+# TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+# THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+'''
+Unit tests for the SortedList container
+'''
+
+import bisect
+import random
+import unittest
+
+import snipe.sortedlist as sortedlist
+
+
+class TestSortedList(unittest.TestCase):
+    def test_empty(self):
+        s = sortedlist.SortedList()
+        self.assertEqual(0, len(s))
+        self.assertFalse(s)
+        self.assertEqual([], list(s))
+        self.assertEqual([], s[:])
+        self.assertEqual(0, s.bisect_left(1))
+        self.assertEqual(0, s.bisect_right(1))
+        with self.assertRaises(IndexError):
+            s[0]
+        with self.assertRaises(ValueError):
+            s.index(1)
+
+    def test_random(self):
+        r = random.Random(0)
+        s = sortedlist.SortedList(load=4)
+        l = []
+        for i in range(500):
+            x = r.randrange(100)
+            s.add(x)
+            bisect.insort_right(l, x)
+        self.assertEqual(l, list(s))
+        self.assertEqual(list(reversed(l)), list(reversed(s)))
+        self.assertEqual(len(l), len(s))
+        self.assertEqual(s, l)
+        for i in range(-len(l), len(l)):
+            self.assertEqual(l[i], s[i])
+        self.assertEqual(l[10:50], s[10:50])
+        self.assertEqual(l[-5:], s[-5:])
+        self.assertEqual(l[::3], s[::3])
+        for x in range(-1, 101):
+            self.assertEqual(bisect.bisect_left(l, x), s.bisect_left(x))
+            self.assertEqual(bisect.bisect_right(l, x), s.bisect_right(x))
+            if x in l:
+                self.assertEqual(l.index(x), s.index(x))
+                self.assertEqual(
+                    l.index(x, l.index(x) + 1, len(l))
+                    if l.count(x) > 1 else None,
+                    s.index(x, l.index(x) + 1)
+                    if l.count(x) > 1 else None)
+            else:
+                with self.assertRaises(ValueError):
+                    s.index(x)
+        self.assertTrue(all(len(b) <= 8 for b in s._blocks))
+
+    def test_append_prepend(self):
+        s = sortedlist.SortedList(load=2)
+        s.extend(range(10, 20))
+        s.append(5)
+        self.assertEqual([5] + list(range(10, 20)), list(s))
+        s.prepend(range(5))
+        self.assertEqual(list(range(5)) + [5] + list(range(10, 20)), list(s))
+        self.assertEqual(14, s[-6])
+        s.prepend([])
+        s.prepend([3, 7])  # not really a prepend
+        self.assertEqual(
+            [0, 1, 2, 3, 3, 4, 5, 7] + list(range(10, 20)), list(s))
+
+        s = sortedlist.SortedList()
+        s.prepend([1, 2, 3])
+        self.assertEqual([1, 2, 3], list(s))
+
+    def test_drop_head(self):
+        s = sortedlist.SortedList(range(10), load=2)
+        s.drop_head(0)
+        self.assertEqual(list(range(10)), list(s))
+        s.drop_head(3)
+        self.assertEqual(list(range(3, 10)), list(s))
+        self.assertEqual(5, s[2])
+        self.assertEqual(2, s.bisect_left(5))
+        s.drop_head(4)
+        self.assertEqual([7, 8, 9], list(s))
+        s.add(1)
+        self.assertEqual([1, 7, 8, 9], list(s))
+        s.drop_head(10)
+        self.assertEqual([], list(s))
+        self.assertEqual(0, len(s))
+
+    def test_merge(self):
+        s = sortedlist.SortedList([1.0, 3.0, 5.0], load=2)
+        self.assertEqual(3, s.merge([4.0, 3.0, 2.0, 6.0, 6.0, 5.0]))
+        self.assertEqual([1.0, 2.0, 3.0, 4.0, 5.0, 6.0], list(s))
+
+    def test_bisect(self):
+        s = sortedlist.SortedList([1, 3, 5])
+        for seq in (s, [1, 3, 5]):
+            self.assertEqual(1, sortedlist.bisect_left(seq, 3))
+            self.assertEqual(2, sortedlist.bisect_right(seq, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# -*- encoding: utf-8 -*-
+# Copyright © 2017 the Snipe contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following
+# disclaimer in the documentation and/or other materials provided
+# with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+# TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+# THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+'''
+Unit tests for the local message store
+'''
+
+import os
+import tempfile
+import unittest
+
+import snipe.store as store
+
+
+class TestMessageStore(unittest.TestCase):
+    def test_add(self):
+        with tempfile.TemporaryDirectory() as directory:
+            s = store.MessageStore(os.path.join(directory, 'backend'))
+            self.assertEqual(0, len(s))
+            self.assertIsNone(s.earliest())
+            self.assertIsNone(s.latest())
+            self.assertEqual([], s.before(float('inf'), 10))
+
+            self.assertTrue(s.add(2.0, 'b', {'body': 'two'}))
+            self.assertTrue(s.add(1.0, 'a', {'body': 'one'}))
+            self.assertTrue(s.add(3.0, 'c', {'body': 'three'}))
+            self.assertFalse(s.add(3.0, 'c', {'body': 'three'}))
+            self.assertFalse(s.add(4.0, None, {'body': 'four'}))
+
+            self.assertEqual(3, len(s))
+            self.assertIn('a', s)
+            self.assertNotIn('d', s)
+            self.assertEqual(1.0, s.earliest())
+            self.assertEqual(3.0, s.latest())
+            self.assertEqual(
+                [(1.0, {'body': 'one'}), (2.0, {'body': 'two'})],
+                s.before(3.0, 10))
+            self.assertEqual([(2.0, {'body': 'two'})], s.before(3.0, 1))
+            self.assertEqual(
+                [(2.0, {'body': 'two'}), (3.0, {'body': 'three'})],
+                s.between(1.5, 4.0))
+            s.close()
+
+    def test_add_many(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'backend')
+            s = store.MessageStore(path)
+            self.assertEqual(0, s.add_many([]))
+            self.assertEqual(2, s.add_many(
+                [(5.0, 5, 'five'), (6.0, 6, 'six'), (7.0, None, 'seven')]))
+            # backfilled
+            self.assertEqual(2, s.add_many(
+                [(1.0, 1, 'one'), (2.0, 2, 'two'), (2.0, 2, 'two')]))
+            # in the middle, and tied
+            self.assertEqual(2, s.add_many(
+                [(5.0, 'five', 'cinq'), (3.0, 3, 'three'), (6.0, 6, 'six')]))
+            # new
+            self.assertEqual(1, s.add_many([(9.0, 9, 'nine')]))
+            expected = [
+                (1.0, 'one'), (2.0, 'two'), (3.0, 'three'), (5.0, 'five'),
+                (5.0, 'cinq'), (6.0, 'six'), (9.0, 'nine')]
+            self.assertEqual(expected, s.between(0, 10))
+            s.close()
+
+            s = store.MessageStore(path)
+            self.assertEqual(expected, s.between(0, 10))
+            s.close()
+
+    def test_reload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'backend')
+            s = store.MessageStore(path)
+            s.add(2.0, 2, {'body': 'two'})
+            s.add(1.0, 1, {'body': 'one\N{SNOWMAN}'})
+            s.close()
+
+            with open(os.path.join(path, store.MessageStore.INDEX), 'a') as fp:
+                fp.write('3.0 9')  # torn write
+
+            s = store.MessageStore(path)
+            self.assertEqual(2, len(s))
+            self.assertIn(1, s)
+            self.assertEqual(
+                [(1.0, {'body': 'one\N{SNOWMAN}'}), (2.0, {'body': 'two'})],
+                s.between(0, 3))
+            self.assertFalse(s.add(1.0, 1, {'body': 'one'}))
+            s.close()
+            self.assertEqual(
+                0o600,
+                os.stat(os.path.join(path, store.MessageStore.SEGMENT)
+                        ).st_mode & 0o777)
+
+    def test_gaps(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'backend')
+            s = store.MessageStore(path)
+            for t in (1.0, 2.0, 5.0, 6.0, 9.0):
+                s.add(t, t, {'time': t})
+            s.island(5.0, 6.0)
+            self.assertEqual([[2.0, 5.0], [6.0, 9.0]], s.gaps)
+
+            def times(mtime, count=10):
+                return [t for (t, data) in s.before(mtime, count)]
+
+            self.assertEqual([9.0], times(10.0))
+            self.assertEqual([], times(9.0))
+            self.assertEqual([], times(7.0))
+            self.assertEqual([5.0], times(6.0))
+            self.assertEqual([], times(6.5))
+            self.assertEqual([], times(5.0))
+            self.assertEqual([], times(4.0))
+            self.assertEqual([1.0], times(2.0))
+            self.assertEqual([], times(2.5))
+
+            s.add(4.0, 4.0, {'time': 4.0})
+            s.gap_fill(5.0, 4.0)
+            self.assertEqual([[2.0, 4.0], [6.0, 9.0]], s.gaps)
+            self.assertEqual([4.0], times(5.0))
+            s.gap_fill(4.0, float('-inf'))
+            self.assertEqual([[6.0, 9.0]], s.gaps)
+            self.assertEqual([1.0, 2.0, 4.0, 5.0], times(6.0))
+            s.close()
+
+            s = store.MessageStore(path)
+            self.assertEqual([[6.0, 9.0]], s.gaps)
+            s.island(7.0, 8.0)
+            self.assertEqual([[6.0, 7.0], [8.0, 9.0]], s.gaps)
+            s.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
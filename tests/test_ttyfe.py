@@ -41,11 +41,62 @@ import unittest.mock
 
 import mocks
 
+import snipe.imbroglio as imbroglio
 import snipe.ttyfe as ttyfe
 import snipe.window as window
 
 
 class TestTTYFrontend(unittest.TestCase):
+    @imbroglio.test
+    async def test_redisplay_frames(self):
+        with mocks.mocked_up_actual_fe() as fe, unittest.mock.patch(
+                'select.select', return_value=([], [], [])):
+            fe.supervisor = await imbroglio.get_supervisor()
+            painted = []
+            fe.windows[0].redisplay = lambda: painted.append(1)
+
+            w = fe.windows[0].window
+            fe.redisplay(w.redisplay_hint())
+            fe.redisplay({'window': None})
+            fe.redisplay(w.redisplay_hint())
+            self.assertEqual([], painted)
+            self.assertIsNotNone(fe.frame_task)
+
+            await imbroglio.sleep(fe.FRAME_INTERVAL * 2)
+            self.assertEqual([1], painted)
+            stats = fe.stats()
+            self.assertEqual(1, stats['frames'])
+            self.assertEqual(2, stats['skipped'])
+
+            # input doesn't wait for the next frame
+            fe.redisplay({'window': None})
+            fe.render(w.redisplay_hint())
+            self.assertEqual([1, 1], painted)
+            self.assertEqual(2, fe.stats()['frames'])
+            self.assertEqual(3, fe.stats()['skipped'])
+
+            # nothing left for the scheduled frame to do
+            await imbroglio.sleep(fe.FRAME_INTERVAL * 2)
+            self.assertEqual(2, fe.stats()['frames'])
+
+    def test_readable_window_switch(self):
+        with mocks.mocked_up_actual_fe() as fe, unittest.mock.patch(
+                'select.select', return_value=([], [], [])):
+            fe.split_window(window.Window(fe), True)
+            self.assertEqual(2, len(fe.windows))
+            painted = []
+            for i, w in enumerate(fe.windows):
+                w.redisplay = lambda i=i: painted.append(i)
+
+            fe.readable_int = lambda k: fe.switch_window(1)
+            with unittest.mock.patch.object(
+                    ttyfe.curses, 'KEY_RESIZE', curses.KEY_RESIZE,
+                    create=True), unittest.mock.patch.object(
+                    fe.stdscr, 'get_wch', create=True,
+                    side_effect=[ord('o'), ttyfe.curses.error]):
+                fe.readable()
+            self.assertEqual([0, 1], sorted(painted))
+
     def test_window_management_0(self):
         with mocks.mocked_up_actual_fe() as fe:
             self.assertEqual(fe.maxy, 24)
@@ -338,6 +389,58 @@ class TestTTYRenderer(unittest.TestCase):
         self.assertEqual(
             ttyfe.TTYRenderer.doline('ab\x96cdef', 3, 3),
             [('abc', 0), ('def', 0)])
+        self.assertEqual(
+            ttyfe.TTYRenderer.doline('abcdefgh\n', 3, 3),
+            [('abc', 0), ('def', 0), ('gh', -1)])
+        self.assertEqual(
+            ttyfe.TTYRenderer.doline(
+                'ab\N{CJK UNIFIED IDEOGRAPH-54C1}c', 3, 3),
+            [('ab', 0), ('\N{CJK UNIFIED IDEOGRAPH-54C1}c', 0)])
+        self.assertEqual(
+            ttyfe.TTYRenderer.doline('abcd', 5, 2, ('right',)),
+            [('', -1), ('abcd', 1)])
+
+    def test_layout_cache(self):
+        layouts = ttyfe.LayoutCache(size=8)
+        self.assertEqual(
+            layouts.get('abcdef', 3, 3), [('abc', 0), ('def', 0)])
+        self.assertEqual((0, 1), (layouts.hits, layouts.misses))
+        self.assertIs(
+            layouts.get('abcdef', 3, 3), layouts.get('abcdef', 3, 3))
+        self.assertEqual((2, 1), (layouts.hits, layouts.misses))
+
+        # only right-justification matters for the key
+        layouts.get('abcdef', 3, 3, frozenset(['bold']))
+        self.assertEqual(3, layouts.hits)
+        self.assertEqual(
+            layouts.get('ab', 3, 3, frozenset(['right'])), [('ab', 1)])
+
+        # the least recently used layouts go when it's over size
+        layouts.get('abcdef', 80, 80)
+        self.assertEqual(
+            [('abcdef', 80, 80, False)], list(layouts.layouts))
+        self.assertEqual(7, layouts.used)
+
+        layouts.clear()
+        self.assertEqual(0, layouts.used)
+        self.assertFalse(layouts.layouts)
+
+    def test_compute_attr(self):
+        w = mocks.Window(cx(['abc\n']))
+        ui = mocks.UI()
+        renderer = ttyfe.TTYRenderer(ui, 0, 24, w)
+        calls = []
+        ui.color_assigner = lambda fg, bg: calls.append((fg, bg)) or 0
+
+        attr = renderer.compute_attr(('bold', 'fg:red'))
+        self.assertEqual(curses.A_BOLD, attr)
+        self.assertEqual([('red', '')], calls)
+        self.assertEqual(attr, renderer.compute_attr({'fg:red', 'bold'}))
+        self.assertEqual([('red', '')], calls)
+
+        ui.attrs.clear()
+        renderer.compute_attr(['bold', 'fg:red'])
+        self.assertEqual([('red', ''), ('red', '')], calls)
 
     def test_chunksize(self):
         w = mocks.Window(cx(['abc\nabc\n', 'def\n', 'ghi\n', 'jkl']))
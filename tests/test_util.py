@@ -87,6 +87,19 @@ class TestGlyphwidth(unittest.TestCase):
                 'x\N{COMBINING DIAERESIS}\N{COMBINING CEDILLA}'),
             1)
         self.assertEqual(snipe.util.glyphwidth('\x96'), 0)
+        self.assertEqual(snipe.util.glyphwidth('a\tb\x7f\n'), 2)
+
+    def test_charwidth(self):
+        self.assertEqual(snipe.util.charwidth('a'), 1)
+        self.assertEqual(snipe.util.charwidth('\N{COMBINING DIAERESIS}'), 0)
+        self.assertEqual(
+            snipe.util.charwidth('\N{CJK UNIFIED IDEOGRAPH-54C1}'), 2)
+        self.assertEqual(snipe.util.charwidth('\x96'), -1)
+        self.assertEqual(snipe.util.charwidth('\N{ZERO WIDTH SPACE}'), -1)
+
+        snipe.util.glyphwidth_reset()
+        self.assertFalse(snipe.util._width_pages)
+        self.assertEqual(snipe.util.charwidth('\N{COMBINING CEDILLA}'), 0)
 
     def test_fallback_wcwidth(self):
         self.assertEqual(snipe.util._fallback_wcwidth('a'), 1)
@@ -196,7 +209,9 @@ class TestConfigurable(unittest.TestCase):
 
         o.context = mocks.Context()
 
+        generation = snipe.util.Configurable.generation
         c.__set__(o, 'bar')
+        self.assertGreater(snipe.util.Configurable.generation, generation)
 
         self.assertEqual(c.__get__(o, None), 'bar')
 
@@ -329,7 +344,8 @@ class MockHTTP:
             json=None,
             data={},
             headers=(),
-            log=None):
+            log=None,
+            pool=None):
         self.url = url
         self._method = method
         self._json = json
@@ -394,6 +410,116 @@ class TestHTTP_JSONmixin(unittest.TestCase):
             self.assertTrue(hjm._is_shutdown)
 
 
+class TestJSONLoads(unittest.TestCase):
+    @snipe.imbroglio.test
+    async def test(self):
+        for text in [
+                '{}', '[]', ' [ ] ', '{"a": [1, 2, {"b": [3]}], "c": {}}',
+                '[[[["deep"]]], "x", {"y": null}, true, 1.5e3]',
+                '"just a string"', '17', ' {"a" : 1 ,"b":[ 2 , 3 ] } ',
+                '{"\\u00e9t\\u00e9": "\\"quoted\\""}',
+                ]:
+            for depth in range(4):
+                self.assertEqual(
+                    json.loads(text),
+                    await snipe.util.json_loads(text, depth),
+                    (text, depth))
+
+        for text in [
+                '', '[', '{', '[1,]', '[1 2]', '{"a" 1}', '{"a": 1,}',
+                '{1: 2}', '[1] 2', '{"a": [1, 2}',
+                ]:
+            with self.assertRaises(ValueError, msg=text):
+                json.loads(text)
+            with self.assertRaises(ValueError, msg=text):
+                await snipe.util.json_loads(text)
+
+    @snipe.imbroglio.test
+    async def test_more(self):
+        for text in [
+                '{"a": [1, 2, {"b": [3]}], "c": {}}',
+                '[[[["deep"]]], "x", {"y": null}, true, 1.5e3, 12345]',
+                '"just a string"', '17', ' {"a" : 1 ,"b":[ 2 , 3 ] } ',
+                '{"\\u00e9t\\u00e9": "\\"quoted\\""}',
+                ]:
+            for size in (1, 2, 5):
+                for depth in range(4):
+                    pieces = [
+                        text[i:i + size] for i in range(size, len(text), size)]
+
+                    async def more():
+                        return pieces.pop(0) if pieces else None
+
+                    self.assertEqual(
+                        json.loads(text),
+                        await snipe.util.json_loads(text[:size], depth, more),
+                        (text, size, depth))
+
+        for text in ['[1,]', '[1 2]', '{"a" 1}', '{"a": [1, 2}', '[1] 2']:
+            pieces = list(text[1:])
+
+            async def more():
+                return pieces.pop(0) if pieces else None
+
+            with self.assertRaises(ValueError, msg=text):
+                await snipe.util.json_loads(text[:1], more=more)
+
+    @snipe.imbroglio.test
+    async def test_yields(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await imbroglio.sleep()
+                ticks += 1
+
+        text = json.dumps({'users': [
+            {'name': str(i), 'profile': {'x': 'y' * 100}}
+            for i in range(50000)]})
+        t = await imbroglio.spawn(ticker())
+        result = await snipe.util.json_loads(text)
+        t.cancel()
+        self.assertEqual(json.loads(text), result)
+        self.assertGreater(ticks, 0)
+
+    def test_mixin(self):
+        with patch('snipe.util.HTTP', MockHTTP()) as _HTTP:
+            hjm = JSONMixinTester()
+            hjm.log = logging.getLogger('test_http_json_mixin')
+            hjm.url = 'http://example.com'
+            hjm.setup_client_session()
+
+            big = ['\u00e9' * 100] * (
+                snipe.util.JSON_INCREMENTAL_THRESHOLD // 100)
+            blob = json.dumps(big, ensure_ascii=False).encode()
+            # split in the middle of a multibyte character
+            _HTTP.blobs = [blob[:1001], blob[1001:]]
+            self.assertEqual(big, imbroglio.run(hjm._get('/foo')))
+
+            _HTTP.blobs = [blob[:-1]]
+            with self.assertRaises(snipe.util.JSONDecodeError):
+                imbroglio.run(hjm._get('/foo'))
+
+            # parsed as it comes in
+            with patch('snipe.util.JSON_INCREMENTAL_THRESHOLD', 1000):
+                _HTTP.blobs = [
+                    blob[i:i + 999] for i in range(0, len(blob), 999)]
+                self.assertEqual(big, imbroglio.run(hjm._get('/foo')))
+
+                truncated = blob[:-1]
+                _HTTP.blobs = [
+                    truncated[i:i + 999]
+                    for i in range(0, len(truncated), 999)]
+                with self.assertRaises(snipe.util.JSONDecodeError):
+                    imbroglio.run(hjm._get('/foo'))
+
+            _HTTP.blobs = [b'"\xff"']
+            with self.assertRaises(snipe.util.JSONDecodeError) as ar:
+                imbroglio.run(hjm._get('/foo'))
+            self.assertIn('\ufffd', str(ar.exception))
+
+
 class MockHTTP_WS:
     def __init__(self):
         self._open = False
@@ -435,6 +561,14 @@ class TestJSONWebSocket(unittest.TestCase):
             imbroglio.run(jws.write('bar'))
             self.assertEqual(json.loads(_HTTP_WS._wrote), 'bar')
 
+            with patch('snipe.util.OFFLOAD_THRESHOLD', 4):
+                _HTTP_WS._toread = json.dumps(['foo', {'bar': 'baz'}])
+                self.assertEqual(
+                    imbroglio.run(jws.read()), ['foo', {'bar': 'baz'}])
+                _HTTP_WS._toread = '["bleah"'
+                with self.assertRaises(snipe.util.JSONDecodeError):
+                    imbroglio.run(jws.read())
+
             _HTTP_WS._toread = 'bleah'
             with self.assertRaisesRegex(
                     snipe.util.JSONDecodeError, '.*bleah.*'):
@@ -489,6 +623,47 @@ class TestNetworkStream(unittest.TestCase):
         self.assertRegex(repr(ns), '^<NetworkStream')
         s.close()
 
+    @snipe.imbroglio.test
+    async def test_drain(self):
+        left, right = socket.socketpair()
+        try:
+            ns = snipe.util.NetworkStream(right)
+            size = len(ns.readbuffer)
+            left.sendall(b'x' * (size + 10))
+
+            # fills the buffer in one go, which then grows
+            self.assertEqual(b'x' * size, bytes(await ns.readsome()))
+            self.assertEqual(size * 2, len(ns.readbuffer))
+            self.assertEqual(b'x' * 10, bytes(await ns.readsome()))
+
+            # and shrinks back down when there's not much traffic
+            left.send(b'y')
+            self.assertEqual(b'y', bytes(await ns.readsome()))
+            self.assertEqual(size, len(ns.readbuffer))
+
+            left.send(b'z')
+            left.close()
+            self.assertEqual(b'z', bytes(await ns.readsome()))
+            self.assertIsNone(await ns.readsome())
+        finally:
+            left.close()
+            right.close()
+
+
+class TestReadBuffer(unittest.TestCase):
+    def test(self):
+        buf = snipe.util.ReadBuffer()
+        self.assertEqual(buf.MIN, len(buf))
+        for i in range(30):
+            view = buf.done(len(buf))
+        self.assertEqual(buf.MAX, len(buf))
+        self.assertEqual(buf.MAX, len(view))
+        buf.done(buf.MAX // 4)
+        self.assertEqual(buf.MAX, len(buf))
+        for i in range(30):
+            buf.done(0)
+        self.assertEqual(buf.MIN, len(buf))
+
 
 class MockStream:
     def __init__(self, pending_eof=True):
@@ -543,11 +718,15 @@ class MockContext:
     def __init__(self):
         self.read_exceptions = []
 
-    def wrap_bio(self, incoming, outgoing, *, server_side, server_hostname):
+    def wrap_bio(
+            self, incoming, outgoing, *, server_side, server_hostname,
+            session=None):
         self.incoming = incoming
         self.outgoing = outgoing
         self.server_side = server_side
         self.server_hostname = server_hostname
+        self.session = session
+        self.session_reused = session is not None
 
         self.do_handshake_called = 0
         self.write_called = 0
@@ -576,16 +755,28 @@ class MockContext:
     def push_exceptions(self, *args):
         self.read_exceptions.extend(args)
 
-    def read(self):
+    def read(self, size=1024, buffer=None):
         if self.read_exceptions:
             raise self.read_exceptions.pop(0)
-        return self.incoming.read()
+        data = self.incoming.read(size)
+        if buffer is None:
+            return data
+        if not data and not self.incoming.eof:
+            raise ssl.SSLWantReadError
+        buffer[:len(data)] = data
+        return len(data)
 
     def pending(self):
         return bool(self.incoming.pending)
 
 
 class TestSSLStream(unittest.TestCase):
+    def setUp(self):
+        snipe.util.SSLStream.reset()
+
+    def tearDown(self):
+        snipe.util.SSLStream.reset()
+
     def test(self):
         imbroglio.run(self._test())
 
@@ -677,7 +868,53 @@ class TestSSLStream(unittest.TestCase):
             self.assertEqual(None, (await ss.readsome()))
 
 
+class TestSSLStreamSessions(unittest.TestCase):
+    def setUp(self):
+        snipe.util.SSLStream.reset()
+
+    def tearDown(self):
+        snipe.util.SSLStream.reset()
+
+    @snipe.imbroglio.test
+    async def test(self):
+        with patch('ssl.create_default_context', MockContext):
+            stats = dict(snipe.util.SSLStream.handshake_stats)
+
+            ss = snipe.util.SSLStream(MockStream(), 'foo')
+            ctx = ss.ctx
+            self.assertIsNone(ss.obj.session)
+            await ss.do_handshake()
+            ss.obj.session = 'a session'  # as if a ticket showed up
+            await ss.close()
+            self.assertEqual('a session', snipe.util.SSLStream.sessions['foo'])
+
+            ss = snipe.util.SSLStream(MockStream(), 'foo')
+            self.assertIs(ctx, ss.ctx)
+            self.assertEqual('a session', ss.obj.session)
+            await ss.do_handshake()
+
+            self.assertEqual(
+                stats['handshakes'] + 2,
+                snipe.util.SSLStream.handshake_stats['handshakes'])
+            self.assertEqual(
+                stats['resumed'] + 1,
+                snipe.util.SSLStream.handshake_stats['resumed'])
+
+        # a new context doesn't get the old one's sessions
+        snipe.util.SSLStream.reset()
+        with patch('ssl.create_default_context', lambda: MockContext()):
+            ss = snipe.util.SSLStream(MockStream(), 'foo')
+            self.assertIsNot(ctx, ss.ctx)
+            self.assertIsNone(ss.obj.session)
+
+
 class TestHTTP(unittest.TestCase):
+    def setUp(self):
+        snipe.util.SSLStream.reset()
+
+    def tearDown(self):
+        snipe.util.SSLStream.reset()
+
     @snipe.imbroglio.test
     async def test_0(self):
         with patch('ssl.create_default_context', MockContext), \
@@ -778,6 +1015,198 @@ class TestHTTP(unittest.TestCase):
             self.assertEqual(b'foo\r\n', (await HTTP.readsome()))
             self.assertIs(None, (await HTTP.readsome()))
 
+    @snipe.imbroglio.test
+    async def test_decompress_offload(self):
+        with patch('snipe.util.NetworkStream', MockStream), \
+                patch('snipe.util.OFFLOAD_THRESHOLD', 16), \
+                patch('snipe.imbroglio.run_in_thread') as run_in_thread:
+            async def run(f, *args):
+                return f(*args)
+            run_in_thread.side_effect = run
+
+            HTTP = await snipe.util.HTTP.request('http://foo/foo')
+            k = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+            big = k.compress(b'foo' * 1000) + k.flush()
+            HTTP.stream.pending_eof = True
+            HTTP.stream.readdata = [
+                b'HTTP/1.1 200 Ok\r\nContent-Encoding: gzip\r\n\r\n',
+                big[:10],
+                big[10:],
+                ]
+
+            self.assertEqual(b'', (await HTTP.readsome()))
+            self.assertEqual(0, run_in_thread.call_count)
+            self.assertEqual(b'foo' * 1000, (await HTTP.readsome()))
+            self.assertEqual(1, run_in_thread.call_count)
+            self.assertIs(None, (await HTTP.readsome()))
+
+    @snipe.imbroglio.test
+    async def test_pool(self):
+        with patch('snipe.util.NetworkStream', MockStream):
+            pool = snipe.util.HTTPPool(log=logging.getLogger('test'))
+
+            async def get(headers=b''):
+                HTTP = await snipe.util.HTTP.request(
+                    'http://foo/foo', pool=pool)
+                self.assertEqual(
+                    b'GET /foo HTTP/1.1\r\nhost: foo\r\n'
+                    b'accept-encoding: gzip\r\n\r\n',
+                    b''.join(HTTP.stream.wrote))
+                HTTP.stream.wrote = []
+                HTTP.stream.readdata = [
+                    b'HTTP/1.1 200 Ok\r\nContent-Length: 3\r\n'
+                    + headers + b'\r\nfoo']
+                self.assertEqual(b'foo', await HTTP.readsome())
+                self.assertIs(None, await HTTP.readsome())
+                await HTTP.close()
+                return HTTP.stream
+
+            stream = await get()
+            self.assertFalse(stream.closed)
+            self.assertIs(stream, await get())
+            self.assertEqual(
+                {'opened': 1, 'reused': 1, 'active': 0, 'idle': 1},
+                pool.stats())
+
+            # the server asked us to hang up
+            self.assertIs(stream, await get(b'Connection: close\r\n'))
+            self.assertTrue(stream.closed)
+            self.assertEqual(0, pool.stats()['idle'])
+
+            # abandoned halfway through
+            HTTP = await snipe.util.HTTP.request('http://foo/foo', pool=pool)
+            await HTTP.close()
+            self.assertTrue(HTTP.stream.closed)
+
+            # the server hung up while it was idle
+            stream = await get()
+            stream.set_eof()
+            stream.readdata = [b'']
+            self.assertIsNot(stream, await get())
+            self.assertTrue(stream.closed)
+
+            # idle too long
+            pool.idle_timeout = 0.0
+            stream = await get()
+            self.assertIsNot(stream, await get())
+            self.assertTrue(stream.closed)
+
+            await pool.close()
+            self.assertEqual(0, pool.stats()['idle'])
+
+    @snipe.imbroglio.test
+    async def test_pool_limit(self):
+        with patch('snipe.util.NetworkStream', MockStream):
+            pool = snipe.util.HTTPPool(max_per_host=1)
+            first = await pool.lease('http', 'foo', 80)
+            other = await pool.lease('http', 'bar', 80)
+            self.assertIsNot(first, other)
+
+            second = None
+
+            async def waiter():
+                nonlocal second
+                second = await pool.lease('http', 'foo', 80)
+
+            t = await imbroglio.spawn(waiter())
+            await imbroglio.sleep(.1)
+            self.assertIsNone(second)
+            first.readdata = []
+            await pool.release('http', 'foo', 80, first, True)
+            await imbroglio.taskwait(t)
+            self.assertIs(first, second)
+
+    @snipe.imbroglio.test
+    async def test_pool_cancel(self):
+        with patch('snipe.util.NetworkStream', MockStream):
+            pool = snipe.util.HTTPPool(max_per_host=1)
+            first = await pool.lease('http', 'foo', 80)
+            first.readdata = []
+            got = []
+            tasks = []
+
+            async def waiter():
+                got.append(await pool.lease('http', 'foo', 80))
+
+            async def waiters():
+                tasks.extend([
+                    await imbroglio.spawn(waiter()),
+                    await imbroglio.spawn(waiter())])
+                await imbroglio.sleep(.1)
+                return tasks[-2:]
+
+            try:
+                # a waiter cancelled while waiting goes away
+                dead, live = await waiters()
+                dead.cancel()
+                await imbroglio.sleep(.1)
+                self.assertEqual(
+                    1, len(pool.waiters[pool.key('http', 'foo', 80)]))
+                await pool.release('http', 'foo', 80, first, True)
+                await imbroglio.sleep(.1)
+                self.assertEqual([first], got)
+
+                # one cancelled after it's been woken passes its turn on
+                dead, live = await waiters()
+                await pool.release('http', 'foo', 80, first, True)
+                dead.cancel()
+                await imbroglio.sleep(.1)
+                self.assertEqual([first, first], got)
+            finally:
+                for t in tasks:
+                    t.cancel()
+
+    @snipe.imbroglio.test
+    async def test_pool_retry(self):
+        class Answering(MockStream):
+            @classmethod
+            async def connect(klass, host, port, log=None):
+                self = await super().connect(host, port, log)
+                self.readdata = [
+                    b'HTTP/1.1 200 Ok\r\nContent-Length: 3\r\n\r\nfoo']
+                return self
+
+        with patch('snipe.util.NetworkStream', Answering):
+            pool = snipe.util.HTTPPool()
+
+            async def get(method='GET'):
+                HTTP = await snipe.util.HTTP.request(
+                    'http://foo/foo', method=method, pool=pool)
+                try:
+                    self.assertEqual(b'foo', await HTTP.readsome())
+                    self.assertIs(None, await HTTP.readsome())
+                finally:
+                    await HTTP.close()
+                return HTTP
+
+            first = (await get()).stream
+            self.assertFalse(first.reof)
+
+            # the server hung up without a word
+            first.set_eof()
+            HTTP = await get()
+            self.assertTrue(first.closed)
+            self.assertIsNot(first, HTTP.stream)
+            self.assertTrue(HTTP.retried)
+            self.assertEqual(
+                {'opened': 2, 'reused': 1, 'active': 0, 'idle': 1},
+                pool.stats())
+
+            # the connection was gone by the time we wrote to it
+            async def broken(data):
+                raise BrokenPipeError
+            HTTP.stream.write = broken
+            stream = (await get()).stream
+            self.assertIsNot(HTTP.stream, stream)
+            self.assertTrue(HTTP.stream.closed)
+
+            # but only if it's safe
+            stream.set_eof()
+            with self.assertRaises(snipe.util.h11.RemoteProtocolError):
+                await get('POST')
+            self.assertTrue(stream.closed)
+            self.assertEqual(0, pool.stats()['active'])
+
 
 class WebSocketServerStream:
     def __init__(self):
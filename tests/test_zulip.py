@@ -34,10 +34,13 @@ Unit tests for zulip backend
 
 import os
 import unittest
+import unittest.mock
 
 import mocks
 
 import snipe.context as context
+import snipe.filters as filters
+import snipe.imbroglio as imbroglio
 import snipe.messages as messages
 import snipe.zulip as zulip
 
@@ -115,5 +118,48 @@ class TestZulipMessage(unittest.TestCase):
             '<ZulipMessage 0.0 <ZulipAddress zulip tim@alum.mit.edu> 3 chars>')
 
 
+class TestZulip(unittest.TestCase):
+    @imbroglio.test
+    async def test_backfill_collision(self):
+        z = zulip.Zulip(context.Context())
+        z.context.ui = mocks.FE()
+        old = zulip.ZulipMessage(z, {'id': 5, 'timestamp': 10.0})
+        z.messages.append(old)
+        self.assertEqual([old], list(z.walk(float('inf'), False)))
+
+        z._get = unittest.mock.Mock(return_value=mocks.promise({
+            'result': 'success',
+            'messages': [
+                {'id': 3, 'timestamp': 10.0},
+                {'id': 4, 'timestamp': 10.0},
+                ],
+            }))
+        await z.do_backfill(None, None)
+
+        # the message that was already there keeps its time
+        self.assertEqual(10.0, old.time)
+        self.assertEqual([3, 4, 5], [m.data['id'] for m in z.messages])
+        self.assertEqual(
+            [3, 4, 5], [m.data['id'] for m in z.walk(float('-inf'), True)])
+        self.assertEqual(
+            [5, 4, 3], [m.data['id'] for m in z.walk(float('inf'), False)])
+        self.assertEqual(
+            [4, 5], [m.data['id'] for m in z.walk(z.messages[1], True)])
+
+    def test_update_drops_indexes(self):
+        z = zulip.Zulip(context.Context())
+        z.context.ui = mocks.FE()
+        m = zulip.ZulipMessage(
+            z, {'id': 1, 'timestamp': 1.0, 'content': 'foo'})
+        z.messages.append(m)
+        f = filters.makefilter('body == "bar"')
+        z.indexes[f] = messages.FilterIndex(f)
+        z.indexes[f].ready = True
+        self.assertEqual([], list(z.walk(float('-inf'), mfilter=f)))
+
+        m.update({'content': 'bar'})
+        self.assertEqual([m], list(z.walk(float('-inf'), mfilter=f)))
+
+
 if __name__ == '__main__':
     unittest.main()